@@ -14,8 +14,10 @@ import imdb_scrap as i_s
 import chatbot_engine as cbe
 import zipfile
 from io import BytesIO
-import metric_eval
 import similarity_search as ss
+import embedding_store as es
+from trend_store import open_trend_store
+import job_queue as jq
 
 # -----------------------------
 # Database setup
@@ -157,6 +159,38 @@ def admin_replace_dataset(username: str, df: pd.DataFrame):
     # Rebuild user folder structure according to your pipeline
     ut.Create_User(username.lower(), df)
 
+# -----------------------------
+# Background jobs (job_queue)
+# -----------------------------
+@st.cache_resource
+def get_job_queue():
+    return jq.JobQueue()
+
+def submit_job(kind, args, state_key):
+    """Queue a job (or reuse the identical active one), remember its id under state_key and make sure workers run."""
+    st.session_state[state_key] = get_job_queue().enqueue(kind, args)
+    jq.ensure_workers()
+    return st.session_state[state_key]
+
+def tracked_job(state_key):
+    """The job remembered under state_key, or None."""
+    job_id = st.session_state.get(state_key)
+    return get_job_queue().get(job_id) if job_id is not None else None
+
+@st.fragment(run_every=2)
+def job_progress(state_key, label):
+    """
+    Progress of an active job, re-polled every 2s without rerunning the page;
+    once the job ends the whole page reruns so the caller can show the result.
+    """
+    job = tracked_job(state_key)
+    if job is None or job['status'] not in jq.ACTIVE:
+        st.rerun(scope="app")
+    st.progress(min(1.0, job['progress'] or 0.0), text=f"{label}: {job['message'] or job['status']}")
+    details = job['details'] or {}
+    if 'train_loss' in details:
+        st.caption(f"Epoch {details['epoch']}/{details['epochs']} | Train loss: {details['train_loss']:.4f} | Val loss: {details['val_loss']:.4f}")
+
 # -----------------------------
 # Login Page
 # -----------------------------
@@ -321,28 +355,67 @@ def admin_page():
                         
                         user_dir = f'User/{user.username}'
                         
-                        # If folder already exists, remove it completely
-                        if os.path.exists(user_dir):
-                            for file in os.listdir(user_dir):
-                                if not file.endswith('_cache.csv') or not file.endswith('history.json'):
-                                    os.remove(os.path.join(user_dir,file))  
-                        
-                        # Now save new dataset
-                        df.to_csv(f'{user_dir}/{user.username}.csv')
+                        os.makedirs(user_dir, exist_ok=True)
+
+                        # Now save new dataset; the trained model, caches and stores stay so
+                        # "Retrain Model" can skip or fine-tune, only stale embedding sidecars go
+                        dataset_path = f'{user_dir}/{user.username}.csv'
+                        df.to_csv(dataset_path)
+                        es.remove_stale_sidecars(dataset_path, keep=es.sidecar_path(dataset_path, ut.file_sha256(dataset_path)))
                         st.success("Dataset updated.")
                     except Exception as e:
                         st.error(f"Failed to update dataset: {e}")
             with c2:
+                retrain_key = f"retrain_job_{user.id}"
                 if st.button("Retrain Model", key=f"retrain_{user.id}"):
-                    try:
-                        # Assumes your training expects folder 'User/<username>' and CSV '<username>.csv'
-                        mt.model_train(f'User/{user.username}', f'{user.username}.csv')
-                        st.success("Model retrained.")
-                    except Exception as e:
-                        st.error(f"Retrain failed: {e}")
+                    # Assumes your training expects folder 'User/<username>' and CSV '<username>.csv'
+                    # runs in the job queue workers, re-scoring cached predictions when the model changed
+                    submit_job("retrain", {"parent_directory": f'User/{user.username}',
+                                           "name_of_dataset": f'{user.username}.csv',
+                                           "user_name": user.username}, retrain_key)
+                job = tracked_job(retrain_key)
+                if job is not None:
+                    if job['status'] in jq.ACTIVE:
+                        job_progress(retrain_key, "Retraining")
+                    elif job['status'] == 'failed':
+                        st.error(f"Retrain failed: {job['error']}")
+                    else:
+                        metadata = job['result']
+                        if metadata['training_mode'] == 'skipped':
+                            st.success(f"Dataset unchanged, kept the trained model (saved ~{metadata['time_saved_seconds']:.0f}s).")
+                        elif metadata['training_mode'] == 'warm_start':
+                            st.success(f"Model fine-tuned on the appended rows in {metadata['train_seconds']:.0f}s (saved ~{metadata['time_saved_seconds']:.0f}s).")
+                        else:
+                            st.success("Model retrained.")
 
     st.markdown("---")
 
+    st.subheader("Retrain All Users")
+    full_retrain = st.checkbox("Full retrain (ignore unchanged datasets)", key="bulk_full")
+    if st.button("Retrain All Models"):
+        # one job, trained across a process pool; an interrupted run resumes where it stopped
+        submit_job("bulk_retrain", {"full": full_retrain}, "bulk_retrain_job")
+    job = tracked_job("bulk_retrain_job")
+    if job is not None:
+        if job['status'] in jq.ACTIVE:
+            job_progress("bulk_retrain_job", "Retraining all users")
+        elif job['status'] == 'failed':
+            st.error(f"Bulk retrain failed: {job['error']}")
+        else:
+            summary = pd.DataFrame(job['result'])
+            failed = int((summary['Status'] != 'ok').sum()) if not summary.empty else 0
+            st.success(f"Retrained {len(summary) - failed} users" + (f", {failed} failed." if failed else "."))
+            st.dataframe(summary, use_container_width=True)
+
+    st.markdown("---")
+
+    with st.expander("Background jobs"):
+        recent = get_job_queue().list(limit=25)
+        if recent:
+            st.dataframe(pd.DataFrame(recent)[['id','kind','status','progress','message','error']], use_container_width=True)
+        else:
+            st.write("No jobs yet.")
+
     with open("test.db", "rb") as f:
         db_bytes = f.read()
 
@@ -606,47 +679,44 @@ def secondary_page():
             if model_status == False:
                 st.text('Model needs to be updated please train the model first ')
                 if st.button('Train Model'):
-                    mt.model_train(f'User/{user.username}', f'{user.username}.csv')
-                    model_status = True
-                    st.rerun()    
+                    submit_job("retrain", {"parent_directory": f'User/{user.username}',
+                                           "name_of_dataset": f'{user.username}.csv',
+                                           "user_name": user.username}, 'train_job')
+                job = tracked_job('train_job')
+                if job is not None:
+                    if job['status'] in jq.ACTIVE:
+                        job_progress('train_job', "Training")
+                    elif job['status'] == 'failed':
+                        st.error(f"Training failed: {job['error']}")
             else:
                 movie_series_name = st.text_input('Movie/Series Name')
                 date_of_release = st.text_input('Release Date (YYYY-MM-DD)').replace('/','-')
                 data_csv=st.file_uploader('Upload csv file from Google Trends:',type=['csv'])
                 data_csv = pd.read_csv(data_csv,skiprows=1) if data_csv is not None else None
-                try:
-                    cache_obj = ut.cache_memory(st.session_state.username)
-                    cache_obj.check_for_cache()
-                    loaded_data = cache_obj.loaded_dataframe
-                except:
-                    loaded_data=pd.DataFrame(columns=['Title','Upload_Date','Hype_Score','Min','Max'])
+                trend_store = open_trend_store(f"User/{user.username}")
+                stored_range = trend_store.date_range(movie_series_name) if movie_series_name else None
+                if stored_range:
+                    st.caption(f"Stored trend data for this title: {stored_range[0]} to {stored_range[1]} ({stored_range[2]} days). Upload a CSV only to add newer data.")
+                cache_obj = ut.cache_memory(st.session_state.username)
                 
                 if st.button("Predict"):
                     try:
-                        mask = (
-                            loaded_data["Title"].str.lower().eq(movie_series_name.lower())
-                            & loaded_data["Upload_Date"].eq(date_of_release)
-                        )
-                        found_data = loaded_data.loc[mask]
-
-                        if not found_data.empty:
-                            row = found_data.iloc[0]
-                            results = {
-                                "title": row["Title"],
-                                "release date": row["Upload_Date"],
-                                "hype score": row["Hype_Score"],
-                                "minimum_view": row["Min"],
-                                "avg_view": row['Avg'],
-                                "max": row["Max"]
-                            }
-                        else:
+                        if data_csv is not None:
+                            # merged into the stored series, inference then reads it by title
+                            trend_store.upsert(movie_series_name, data_csv)
+                        model_version = mt.current_model_version(f"User/{user.username}", user.username)
+                        results = cache_obj.lookup(movie_series_name, date_of_release, model_version)
+
+                        if results is None:
                             results = mt.model_inference(
                                 movie_series_name,
                                 date_of_release,
-                                data_csv,
+                                None,
                                 f"User/{user.username}",
                                 user.username,
                             )
+                            if results is None:
+                                raise ValueError("no prediction, upload a Google Trends CSV if none is stored for this title")
                             cache_obj.dump_data(
                                 results["title"],
                                 results["release date"],
@@ -654,6 +724,7 @@ def secondary_page():
                                 results["minimum_view"],
                                 results['avg_view'],
                                 results["max"],
+                                model_version=results["model_version"],
                             )
 
                         # ---- Render results ----
@@ -722,9 +793,7 @@ def secondary_page():
                     
                     st.subheader("Prediction History")
                     # Load cached data
-                    cache_obj = ut.cache_memory(st.session_state.username)
-                    cache_obj.check_for_cache()
-                    loaded_data = cache_obj.loaded_dataframe
+                    loaded_data = cache_obj.store.history()
 
                     st.dataframe(loaded_data, use_container_width=True)
 
@@ -806,10 +875,19 @@ def secondary_page():
             st.set_page_config(page_title="🔍Similar Movie Finder", layout="wide")
             st.title("🔍 Similar Movie Finder")
             movie_name=st.text_area('Enter Movie Name to get Similar Movies',value='The Matrix')
+            search_mode=st.radio('Search mode',options=['vector','hybrid','lexical'],index=0,horizontal=True,key='similar_mode',help='hybrid/lexical also match exact names, actors and directors, and skip the LLM')
             numb_of_movies=st.selectbox('How many similar movies do you want?',options=[5,10,15,20],index=0,key='num_similar_movies')
+            with st.expander('Filters (optional)'):
+                genre_filter=st.text_input('Only these genres (comma separated)',value='',key='similar_genres')
+                year_after=st.number_input('Released in or after (0 = any year)',min_value=0,max_value=2100,value=0,step=1,key='similar_year')
+            filters={}
+            if genre_filter.strip():
+                filters['genres']=[g.strip() for g in genre_filter.split(',') if g.strip()]
+            if year_after:
+                filters['year_min']=int(year_after)
             if st.button('Get Similar Movies!'):
                 with st.spinner("🔍 Getting Similar Movies, please wait..."):
-                    op=ss.recommend(movie_name,top_n=numb_of_movies)
+                    op=ss.recommend(movie_name,top_n=numb_of_movies,filters=filters or None,mode=search_mode)
                 if op:
                     
                     # Convert to DataFrame for nicer display
@@ -919,15 +997,21 @@ def secondary_page():
             flag='Accuracy'
             with col1:
                 if st.button("✅ Get Accuracy!"):
-                    with st.spinner("🔍 Calculating Accuracy, please wait..."):
-                        me = metric_eval.metric_eval(f'User/{st.session_state.username}/{st.session_state.username}_cache.csv')
-                        op = me.calculate_metrics(flag=flag)
+                    submit_job("metric_eval", {"user_name": st.session_state.username, "flag": "Accuracy"}, 'metric_job')
             with col2:
                 if st.button("🔬 Get Precision!"):
-                    flag='Precision'
-                    with st.spinner("🔍 Calculating Precision, please wait..."):
-                        me = metric_eval.metric_eval(f'User/{st.session_state.username}/{st.session_state.username}_cache.csv')
-                        op = me.calculate_metrics(flag=flag)
+                    submit_job("metric_eval", {"user_name": st.session_state.username, "flag": "Precision"}, 'metric_job')
+
+            # evaluation runs in the job queue workers, the page polls it
+            job = tracked_job('metric_job')
+            if job is not None:
+                flag = job['args']['flag']
+                if job['status'] in jq.ACTIVE:
+                    job_progress('metric_job', f"🔍 Calculating {flag}")
+                elif job['status'] == 'failed':
+                    st.error(f"{flag} calculation failed: {job['error']}")
+                else:
+                    op = job['result']
 
             try:
                 # Extract values from op (adjust if your calculate_metrics returns differently)
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+USER_ROOT = "User"
+STATE_FILE = "bulk_retrain_state.json"
+SUMMARY_FILE = "bulk_retrain_summary.csv"
+SUMMARY_COLUMNS = ['User', 'Status', 'Training_Mode', 'Seconds', 'Train_Seconds', 'Best_Train', 'Best_Val',
+                   'Epochs_Run', 'Rescored', 'Error']
+
+
+def discover_users(root=USER_ROOT):
+    """Names of the User/<name> folders that hold a <name>.csv dataset, sorted."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if os.path.isfile(os.path.join(root, name, f"{name}.csv")))
+
+
+def default_threads(max_workers):
+    """torch intra-op threads per worker so max_workers workers don't oversubscribe the cores."""
+    return max(1, (os.cpu_count() or 1) // max_workers)
+
+
+def _init_worker(num_threads):
+    # before torch is imported, so OpenMP/MKL pools are sized once
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+    import torch
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+
+
+def _retrain_user(root, user_name, full, rescore, train_kwargs):
+    """Train one user's model in a worker; returns a summary row (never raises)."""
+    parent_directory = os.path.join(root, user_name)
+    start = time.perf_counter()
+    row = {'User': user_name}
+    try:
+        import model_work as mt
+        # through train_if_changed even when full, so the dataset snapshot is updated
+        metadata = mt.train_if_changed(parent_directory, f"{user_name}.csv", force_full=full, **train_kwargs)
+        rescored = 0
+        if rescore and metadata['training_mode'] != 'skipped':
+            rescored = mt.rescore_top_predictions(parent_directory, user_name)
+        row.update({
+            'Status': 'ok',
+            'Training_Mode': metadata['training_mode'],
+            'Train_Seconds': metadata.get('train_seconds'),
+            'Best_Train': metadata.get('best_train'),
+            'Best_Val': metadata.get('best_val'),
+            'Epochs_Run': metadata.get('epochs_run'),
+            'Rescored': rescored,
+        })
+    except Exception as e:
+        traceback.print_exc()
+        row.update({'Status': 'failed', 'Error': f"{type(e).__name__}: {e}"})
+    row['Seconds'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+class BulkRetrain:
+    """
+    Retrains every user's model across a pool of spawned worker processes.
+
+    Each worker trains one user at a time with torch capped at num_threads
+    intra-op threads (default: cores / max_workers). By default train_if_changed
+    decides per user whether to skip, fine-tune or fully retrain; full=True
+    retrains from scratch (e.g. after a change to the training code).
+
+    Progress is recorded per user in <root>/bulk_retrain_state.json as each
+    user finishes, so an interrupted run started again with resume=True only
+    trains the users that have not finished. The per-user summary (wall time,
+    training mode, best losses) is written to <root>/bulk_retrain_summary.csv.
+    """
+    def __init__(self, root=USER_ROOT, max_workers=None, num_threads=None, full=False, rescore=True,
+                 train_kwargs=None):
+        self.root = root
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 1) // 2))
+        self.num_threads = num_threads or default_threads(self.max_workers)
+        self.full = full
+        self.rescore = rescore
+        self.train_kwargs = dict(train_kwargs or {})
+        self.state_path = os.path.join(root, STATE_FILE)
+        self.summary_path = os.path.join(root, SUMMARY_FILE)
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_state(self, state):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def run(self, users=None, resume=True, progress_callback=None):
+        """
+        Retrain users (default: discover_users(root)) and return the summary
+        frame of this run, including users finished by an earlier interrupted
+        run when resume is set. Failed users are retried on resume; once every
+        user has succeeded the state is marked completed and the next run
+        starts over.
+        progress_callback(done, total, row) is called as each user finishes.
+        """
+        users = list(users) if users is not None else discover_users(self.root)
+        state = self.load_state() if resume else {}
+        options = {'full': self.full, 'train_kwargs': self.train_kwargs}
+        if state.get('options') != options or state.get('completed'):
+            # a different kind of run, or the last one finished: start over
+            state = {}
+        state = {'options': options, 'started': state.get('started', time.time()),
+                 'users': state.get('users', {})}
+        finished = {name: row for name, row in state['users'].items() if row.get('Status') == 'ok'}
+        state['users'] = finished
+        todo = [name for name in users if name not in finished]
+        self._save_state(state)
+
+        done = len(users) - len(todo)
+        if todo:
+            print(f"Retraining {len(todo)} users ({done} already done) with {self.max_workers} workers "
+                  f"x {self.num_threads} threads", flush=True)
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(todo)),
+                                     mp_context=mp.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(self.num_threads,)) as pool:
+                futures = {pool.submit(_retrain_user, self.root, name, self.full, self.rescore, self.train_kwargs): name
+                           for name in todo}
+                for future in as_completed(futures):
+                    row = future.result()
+                    state['users'][row['User']] = row
+                    self._save_state(state)
+                    done += 1
+                    print(f"[{done}/{len(users)}] {row['User']}: {row['Status']} "
+                          f"{row.get('Training_Mode') or row.get('Error')} in {row['Seconds']:.1f}s", flush=True)
+                    if progress_callback is not None:
+                        progress_callback(done, len(users), row)
+
+        state['completed'] = all(state['users'].get(name, {}).get('Status') == 'ok' for name in users)
+        self._save_state(state)
+
+        summary = pd.DataFrame([state['users'][name] for name in users if name in state['users']],
+                               columns=SUMMARY_COLUMNS)
+        tmp = self.summary_path + ".tmp"
+        summary.to_csv(tmp, index=False)
+        os.replace(tmp, self.summary_path)
+        return summary
+
+
+def retrain_all(root=USER_ROOT, max_workers=None, num_threads=None, full=False, resume=True, **train_kwargs):
+    """BulkRetrain(root, max_workers, num_threads, full, train_kwargs=train_kwargs).run(resume=resume)."""
+    return BulkRetrain(root, max_workers=max_workers, num_threads=num_threads, full=full,
+                       train_kwargs=train_kwargs).run(resume=resume)
+
+
+if __name__ == "__main__":
+    # python bulk_retrain.py [workers] [--threads N] [--full] [--fresh] [--root User] [user ...]
+    argv = sys.argv[1:]
+
+    def option(name, default=None):
+        if name in argv:
+            i = argv.index(name)
+            value = argv[i + 1]
+            del argv[i:i + 2]
+            return value
+        return default
+
+    def flag(name):
+        if name in argv:
+            argv.remove(name)
+            return True
+        return False
+
+    root = option("--root", USER_ROOT)
+    threads = option("--threads")
+    full = flag("--full")
+    fresh = flag("--fresh")
+    workers = int(argv.pop(0)) if argv and argv[0].isdigit() else None
+    bulk = BulkRetrain(root, max_workers=workers, num_threads=int(threads) if threads else None, full=full)
+    summary = bulk.run(users=argv or None, resume=not fresh)
+    print(summary.to_string(index=False))
+    print(f"Summary written to {bulk.summary_path}")
@@ -17,7 +17,8 @@ HISTORY_FILE = "conversation_history.json"
 
 def load_data_for_youtuber(username):
     """Load the user's dataset."""
-    data = pd.read_csv(f'User/{username}/{username}.csv')
+    # the embeddings text column is never used by the chatbot, skip parsing it
+    data = pd.read_csv(f'User/{username}/{username}.csv', usecols=lambda c: c != 'embeddings')
     return data 
 
 
@@ -137,6 +138,12 @@ def ask_gemini(user_message: str, history: list, username: str, user_data: pd.Da
     except Exception as e:
         return f"An error occurred: {e}"
 
+def is_failed_reply(text) -> bool:
+    """True for the placeholder texts the ask_gemini* helpers return instead of raising."""
+    return (not text or not text.strip() or text == "No response generated."
+            or text.startswith("An error occurred:"))
+
+
 def ask_gemini_similarity(user_message: str) -> str:
     """
     Stateless Gemini call using a merged prompt (system + user).
@@ -0,0 +1,232 @@
+import os
+import calendar
+import time
+import numpy as np
+import joblib
+import torch
+import utilities as ut
+from view_predictor import ViewPredictor
+
+COMPILED_FILE = "compiled.npz"
+# weekday_index follows datetime.weekday(): Monday=0 ... Sunday=6
+WEEKDAYS = list(calendar.day_name)
+# folded vs torch predictions (views in thousands, float32) must agree this closely
+PARITY_RTOL = 1e-4
+PARITY_ATOL = 1e-3
+
+
+def _fold_batchnorm(linear, bn):
+    """Eval-mode BatchNorm after a Linear layer folded into that layer's weight/bias."""
+    weight = linear.weight.detach().double().numpy()
+    bias = linear.bias.detach().double().numpy()
+    gamma = bn.weight.detach().double().numpy()
+    beta = bn.bias.detach().double().numpy()
+    mean = bn.running_mean.detach().double().numpy()
+    var = bn.running_var.detach().double().numpy()
+    factor = gamma / np.sqrt(var + bn.eps)
+    return weight * factor[:, None], (bias - mean) * factor + beta
+
+
+def fold(preprocessor, model):
+    """
+    Fold the fitted ColumnTransformer (OneHotEncoder on publish_day,
+    StandardScaler on trend_score + emb_*) and the eval-mode BatchNorms into
+    the Linear layers of a ViewPredictor. Dropout is the identity at inference.
+    Returns a dict of float32 arrays for CompiledViewPredictor.
+    """
+    net = model.net
+    w1, b1 = _fold_batchnorm(net[1], net[2])
+    w2, b2 = _fold_batchnorm(net[5], net[6])
+    w3 = net[9].weight.detach().double().numpy()
+    b3 = net[9].bias.detach().double().numpy()
+
+    day_slice = preprocessor.output_indices_["day"]
+    num_slice = preprocessor.output_indices_["num"]
+    encoder = preprocessor.named_transformers_["day"]
+    scaler = preprocessor.named_transformers_["num"]
+
+    # x_scaled = (x - mean) / scale  ->  W @ x_scaled = (W / scale) @ x - (W / scale) @ mean
+    w_num = w1[:, num_slice] / scaler.scale_[None, :]
+    b1 = b1 - w_num @ scaler.mean_
+
+    # one-hot columns become a per-weekday bias row; unknown days stay zero (handle_unknown="ignore")
+    categories = list(encoder.categories_[0])
+    w_day = w1[:, day_slice]
+    day_table = np.zeros((len(WEEKDAYS), w1.shape[0]))
+    for idx, day in enumerate(WEEKDAYS):
+        if day in categories:
+            day_table[idx] = w_day[:, categories.index(day)]
+
+    return {
+        "w_trend": w_num[:, 0].astype(np.float32),
+        "w_emb": w_num[:, 1:].T.astype(np.float32),
+        "day_table": day_table.astype(np.float32),
+        "b1": b1.astype(np.float32),
+        "w2": w2.T.astype(np.float32),
+        "b2": b2.astype(np.float32),
+        "w3": w3.T.astype(np.float32),
+        "b3": b3.astype(np.float32),
+    }
+
+
+def source_digest(parent_directory):
+    """Hash of the artifacts a compiled file was built from (model.pth + preprocessor.pkl)."""
+    return (ut.file_sha256(os.path.join(parent_directory, "model.pth"))
+            + ut.file_sha256(os.path.join(parent_directory, "preprocessor.pkl")))
+
+
+def verify_fold(preprocessor, model, arrays, n_rows=64, seed=0):
+    """
+    Score random inputs through the folded arrays and through
+    ColumnTransformer -> torch; raises RuntimeError when they disagree beyond
+    PARITY_RTOL/PARITY_ATOL. Returns the max abs difference.
+    """
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    dim = arrays["w_emb"].shape[0]
+    trend = rng.integers(0, 101, n_rows)
+    weekday_index = rng.integers(0, 7, n_rows)
+    embeddings = rng.normal(0, 0.05, (n_rows, dim)).astype(np.float32)
+
+    frame = pd.DataFrame(embeddings, columns=[f"emb_{i}" for i in range(dim)])
+    frame.insert(0, "publish_day", [WEEKDAYS[i] for i in weekday_index])
+    frame.insert(0, "trend_score", trend.astype(float))
+    with torch.no_grad():
+        reference = model(torch.tensor(preprocessor.transform(frame), dtype=torch.float32)).numpy().reshape(-1)
+    folded = CompiledViewPredictor(arrays).predict(trend, weekday_index, embeddings)
+
+    diff = float(np.max(np.abs(reference - folded)))
+    if not np.allclose(folded, reference, rtol=PARITY_RTOL, atol=PARITY_ATOL):
+        raise RuntimeError(f"Folded model disagrees with the torch model (max abs diff {diff:.3g}), not exporting")
+    return diff
+
+
+def export_compiled(parent_directory):
+    """
+    Build compiled.npz next to model.pth/preprocessor.pkl. Call after training.
+    The folded graph is checked against the torch model first (verify_fold).
+    """
+    preprocessor = joblib.load(os.path.join(parent_directory, "preprocessor.pkl"))
+    state_dict = torch.load(os.path.join(parent_directory, "model.pth"), map_location="cpu")
+    model = ViewPredictor(state_dict["net.1.weight"].shape[1])
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    arrays = fold(preprocessor, model)
+    verify_fold(preprocessor, model, arrays)
+    path = os.path.join(parent_directory, COMPILED_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, source=np.array(source_digest(parent_directory)), **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+class CompiledViewPredictor:
+    """Pure-NumPy view predictor: (trend_score, weekday_index, embedding) -> views (thousands)."""
+    def __init__(self, arrays):
+        self.w_trend = arrays["w_trend"]
+        self.w_emb = arrays["w_emb"]
+        self.day_table = arrays["day_table"]
+        self.b1 = arrays["b1"]
+        self.w2 = arrays["w2"]
+        self.b2 = arrays["b2"]
+        self.w3 = arrays["w3"]
+        self.b3 = arrays["b3"]
+        self.size_bytes = sum(a.nbytes for a in arrays.values())
+
+    @classmethod
+    def load(cls, parent_directory, verify=True, source=None):
+        """
+        Load compiled.npz, or return None when it is missing or (verify=True)
+        was built from a different model.pth/preprocessor.pkl than the current
+        ones (or than `source`, the source_digest of already loaded files).
+        """
+        path = os.path.join(parent_directory, COMPILED_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if verify and str(data["source"]) != (source or source_digest(parent_directory)):
+                print(f"{path} is stale, falling back to the sklearn/torch path")
+                return None
+            return cls({k: data[k] for k in data.files if k != "source"})
+
+    def predict(self, trend_scores, weekday_index, embeddings):
+        trend_scores = np.asarray(trend_scores, dtype=np.float32).reshape(-1)
+        weekday_index = np.asarray(weekday_index, dtype=np.int64).reshape(-1)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(trend_scores), -1)
+
+        h = embeddings @ self.w_emb
+        h += trend_scores[:, None] * self.w_trend
+        h += self.day_table[weekday_index]
+        h += self.b1
+        np.maximum(h, 0, out=h)
+        h = h @ self.w2 + self.b2
+        np.maximum(h, 0, out=h)
+        return (h @ self.w3 + self.b3).reshape(-1)
+
+
+def check_parity(parent_directory, user_name, n_rows=256, seed=0):
+    """
+    Score random inputs through the compiled artifact and through the
+    DataFrame -> ColumnTransformer -> torch path; returns the max abs difference.
+    """
+    import model_work as mt
+    from model_registry import load_artifacts
+
+    artifacts = load_artifacts(parent_directory, user_name)
+    compiled = CompiledViewPredictor.load(parent_directory)
+    if compiled is None:
+        raise FileNotFoundError(f"No up-to-date {COMPILED_FILE} in {parent_directory}, run export_compiled first.")
+    artifacts.compiled = None
+
+    rng = np.random.default_rng(seed)
+    dim = compiled.w_emb.shape[0]
+    trend = rng.integers(0, 101, n_rows)
+    weekday_index = rng.integers(0, 7, n_rows)
+    embeddings = rng.normal(0, 0.05, (n_rows, dim)).astype(np.float32)
+
+    reference = mt.predict_views_batch(artifacts, trend, [WEEKDAYS[i] for i in weekday_index], embeddings)
+    folded = compiled.predict(trend, weekday_index, embeddings)
+    return float(np.max(np.abs(reference - folded)))
+
+
+def benchmark(parent_directory, user_name, batch_sizes=(1, 30, 1000), repeats=50):
+    """Mean latency (ms) of the sklearn/torch path vs the compiled path per batch size."""
+    import model_work as mt
+    from model_registry import load_artifacts
+
+    artifacts = load_artifacts(parent_directory, user_name)
+    artifacts.compiled = None
+    compiled = CompiledViewPredictor.load(parent_directory)
+    dim = compiled.w_emb.shape[0]
+    rng = np.random.default_rng(0)
+    results = []
+    for n_rows in batch_sizes:
+        trend = rng.integers(0, 101, n_rows)
+        weekday_index = rng.integers(0, 7, n_rows)
+        weekday_names = [WEEKDAYS[i] for i in weekday_index]
+        embeddings = rng.normal(0, 0.05, (n_rows, dim)).astype(np.float32)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            mt.predict_views_batch(artifacts, trend, weekday_names, embeddings)
+        torch_ms = (time.perf_counter() - start) / repeats * 1000
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            compiled.predict(trend, weekday_index, embeddings)
+        compiled_ms = (time.perf_counter() - start) / repeats * 1000
+        results.append({"rows": n_rows, "sklearn_torch_ms": torch_ms, "compiled_ms": compiled_ms,
+                        "speedup": torch_ms / max(compiled_ms, 1e-9)})
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    # python compiled_model.py User/<name> <name>
+    parent_directory, user_name = sys.argv[1], sys.argv[2]
+    export_compiled(parent_directory)
+    print(f"max abs diff vs current path: {check_parity(parent_directory, user_name):.2e}")
+    for row in benchmark(parent_directory, user_name):
+        print(row)
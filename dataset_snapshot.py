@@ -0,0 +1,94 @@
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import utilities as ut
+
+SNAPSHOT_FILE = "dataset_snapshot.json"
+ROWS_FILE = "dataset_rows.npy"
+
+
+def row_hashes(csv_path):
+    """
+    uint64 hash per dataset row (index-like 'Unnamed: n' columns ignored), so an
+    appended dataset can be recognised as a superset of the previous one.
+    """
+    data = pd.read_csv(csv_path)
+    data = data.loc[:, [c for c in data.columns if not str(c).startswith("Unnamed:")]]
+    return pd.util.hash_pandas_object(data, index=False).to_numpy(dtype=np.uint64)
+
+
+def load_snapshot(parent_directory):
+    """(snapshot dict, row hashes) of the last trained dataset, or (None, None)."""
+    path = os.path.join(parent_directory, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None, None
+    with open(path) as f:
+        snapshot = json.load(f)
+    rows_path = os.path.join(parent_directory, ROWS_FILE)
+    rows = np.load(rows_path) if os.path.exists(rows_path) else None
+    return snapshot, rows
+
+
+def save_snapshot(parent_directory, dataset_hash, rows, metadata, mode):
+    snapshot = {
+        "dataset_hash": dataset_hash,
+        "n_rows": int(len(rows)),
+        "model_version": metadata.get("model_version"),
+        "mode": mode,
+        "train_seconds": metadata.get("train_seconds"),
+        # what a full retrain of this dataset costs, carried over by fine-tunes
+        "full_train_seconds": metadata.get("full_train_seconds", metadata.get("train_seconds")),
+        "trained_at": time.time(),
+    }
+    rows_path = os.path.join(parent_directory, ROWS_FILE)
+    tmp = rows_path + ".tmp.npy"
+    np.save(tmp, rows)
+    os.replace(tmp, rows_path)
+    path = os.path.join(parent_directory, SNAPSHOT_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+    return snapshot
+
+
+def rehash_snapshot(parent_directory, snapshot, dataset_hash):
+    """
+    Point the snapshot at a re-saved file with the same rows (new bytes, e.g. an
+    extra index column), so later checks match it by hash again.
+    """
+    snapshot = dict(snapshot, dataset_hash=dataset_hash)
+    path = os.path.join(parent_directory, SNAPSHOT_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+    return snapshot
+
+
+def classify(parent_directory, csv_path, max_append_ratio=0.2):
+    """
+    Compare csv_path with the last trained snapshot.
+
+    Returns (mode, dataset_hash, rows, snapshot) where mode is
+      'unchanged' - same bytes as the last trained dataset, or the same rows
+                    in a re-saved file,
+      'append'    - every previous row is still present and at most
+                    max_append_ratio new rows were added,
+      'full'      - anything else (or no snapshot yet).
+    """
+    dataset_hash = ut.file_sha256(csv_path)
+    snapshot, previous = load_snapshot(parent_directory)
+    if snapshot is not None and snapshot["dataset_hash"] == dataset_hash:
+        return "unchanged", dataset_hash, previous, snapshot
+    rows = row_hashes(csv_path)
+    if snapshot is not None and previous is not None and np.array_equal(rows, previous):
+        return "unchanged", dataset_hash, previous, snapshot
+    if snapshot is None or previous is None or len(rows) <= len(previous):
+        return "full", dataset_hash, rows, snapshot
+    added = len(rows) - len(previous)
+    if added <= max_append_ratio * len(previous) and np.isin(previous, rows).all():
+        return "append", dataset_hash, rows, snapshot
+    return "full", dataset_hash, rows, snapshot
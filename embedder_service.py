@@ -0,0 +1,186 @@
+import time
+import queue
+import threading
+import numpy as np
+import embedding_cache as ec
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+class _EncodeRequest:
+    def __init__(self, texts, normalize_embeddings):
+        self.texts = texts
+        self.normalize_embeddings = normalize_embeddings
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbedderService:
+    """
+    Process-wide SentenceTransformer wrapper.
+
+    The model is loaded on the first encode call, not at import. Concurrent
+    encode calls (e.g. several Streamlit sessions) are queued and a single
+    worker thread merges everything that arrives within `window` seconds
+    (up to max_batch texts) into one model.encode call.
+
+    encode() mirrors SentenceTransformer.encode for the arguments this repo
+    uses: a str gives a 1-D float32 array, a list gives a 2-D one. With a
+    cache (embedding_cache.EmbeddingCache) only texts never seen before for
+    this model/normalization reach the model.
+    """
+    def __init__(self, model_name=DEFAULT_MODEL, window=0.005, max_batch=64, cache=None):
+        self.model_name = model_name
+        self.cache = cache
+        self.window = window
+        self.max_batch = max_batch
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._stats_lock = threading.Lock()
+        self.load_seconds = None
+        self.requests = 0
+        self.batches = 0
+        self.texts_encoded = 0
+        self.largest_batch = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    start = time.perf_counter()
+                    self._model = SentenceTransformer(self.model_name)
+                    self.load_seconds = time.perf_counter() - start
+                    print(f"Loaded {self.model_name} in {self.load_seconds:.2f}s")
+        return self._model
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._load_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name=f"embedder-{self.model_name}", daemon=True)
+                    self._worker.start()
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        if kwargs:
+            # anything beyond the common arguments goes straight to the model
+            return self.model.encode(sentences, convert_to_numpy=convert_to_numpy,
+                                     normalize_embeddings=normalize_embeddings, **kwargs)
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        request = _EncodeRequest(texts, bool(normalize_embeddings))
+        self._ensure_worker()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result[0] if single else request.result
+
+    def _collect(self):
+        """Block for one request, then gather more until the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        n_texts = len(batch[0].texts)
+        deadline = time.monotonic() + self.window
+        while n_texts < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_texts += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            for normalize in (False, True):
+                group = [r for r in batch if r.normalize_embeddings == normalize]
+                if group:
+                    self._encode_group(group, normalize)
+
+    def _encode_group(self, group, normalize):
+        texts = [t for r in group for t in r.texts]
+        n_encoded = 0
+        try:
+            keys = [ec.cache_key(self.model_name, normalize, t) for t in texts]
+            found = self.cache.get_many(keys) if self.cache is not None else {}
+
+            # encode each missing text once, even if several requests asked for it
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            if missing:
+                vectors = self.model.encode(list(missing.values()), convert_to_numpy=True, normalize_embeddings=normalize)
+                vectors = np.asarray(vectors, dtype=np.float32)
+                new_items = list(zip(missing.keys(), vectors))
+                found.update(new_items)
+                n_encoded = len(new_items)
+                if self.cache is not None:
+                    self.cache.put_many(new_items)
+
+            offset = 0
+            for r in group:
+                r.result = np.stack([found[k] for k in keys[offset:offset + len(r.texts)]])
+                offset += len(r.texts)
+        except Exception as e:
+            for r in group:
+                r.error = e
+        finally:
+            with self._stats_lock:
+                self.requests += len(group)
+                self.batches += 1
+                self.texts_encoded += n_encoded
+                self.largest_batch = max(self.largest_batch, n_encoded)
+            for r in group:
+                r.done.set()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "load_seconds": self.load_seconds,
+                "queue_depth": self._queue.qsize(),
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts_encoded": self.texts_encoded,
+                "mean_batch_size": self.texts_encoded / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedder(model_name=DEFAULT_MODEL):
+    """Shared EmbedderService for model_name (one per process), backed by the shared embedding cache."""
+    with _services_lock:
+        if model_name not in _services:
+            _services[model_name] = EmbedderService(model_name, cache=ec.get_cache())
+        return _services[model_name]
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+    embedder = get_embedder()
+    titles = [f"Movie number {i}" for i in range(200)]
+    embedder.encode("warm up")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(embedder.encode, titles))
+    print(f"200 concurrent single encodes: {time.perf_counter()-start:.2f}s")
+    print(embedder.stats())
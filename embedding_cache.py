@@ -0,0 +1,139 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "embeddings")
+KEY_BYTES = 32   # sha256 digest stored in front of every vector
+
+
+def cache_key(model_name, normalize, text):
+    """Content address of one embedding: (model name, normalization flag, text)."""
+    return hashlib.sha256(f"{model_name}\0{int(bool(normalize))}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed float32 embedding cache shared by every embedder.encode call.
+
+    Vectors are appended to vectors.f32 as [32-byte key][dim float32]; an
+    SQLite index maps key -> (offset, dim, last_used). The key header is
+    checked on every read, so an index entry that points at rewritten data
+    (e.g. after another process compacted the file) is treated as a miss.
+    When the data file grows past max_bytes it is compacted down to the most
+    recently used entries (about 75% of max_bytes).
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=256 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, "vectors.f32")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, offset INTEGER NOT NULL, dim INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys that are cached."""
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            rows = []
+            unique = list(set(keys))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows += self._conn.execute(
+                    f"SELECT key, offset, dim FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            if rows and os.path.exists(self.data_path):
+                with open(self.data_path, "rb") as f:
+                    for key, offset, dim in rows:
+                        f.seek(offset)
+                        record = f.read(KEY_BYTES + 4 * dim)
+                        if len(record) == KEY_BYTES + 4 * dim and record[:KEY_BYTES] == key:
+                            found[key] = np.frombuffer(record, dtype=np.float32, offset=KEY_BYTES).copy()
+                now = time.time()
+                self._conn.executemany("UPDATE entries SET last_used=? WHERE key=?", [(now, k) for k in found])
+                self._conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items):
+        """items: iterable of (key, vector). Appends the vectors and indexes them."""
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            now = time.time()
+            entries = []
+            with open(self.data_path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                for key, vector in items:
+                    vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+                    entries.append((key, f.tell(), vector.size, now))
+                    f.write(key)
+                    f.write(vector.tobytes())
+                size = f.tell()
+            self._conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", entries)
+            self._conn.commit()
+            if size > self.max_bytes:
+                self._compact(int(self.max_bytes * 0.75))
+
+    def _compact(self, target_bytes):
+        """Rewrite the data file keeping the most recently used entries (lock held)."""
+        rows = self._conn.execute("SELECT key, offset, dim FROM entries ORDER BY last_used DESC").fetchall()
+        tmp_path = f"{self.data_path}.{os.getpid()}.tmp"
+        kept, dropped = [], []
+        with open(self.data_path, "rb") as src, open(tmp_path, "wb") as dst:
+            for key, offset, dim in rows:
+                record_size = KEY_BYTES + 4 * dim
+                if dst.tell() + record_size > target_bytes:
+                    dropped.append((key,))
+                    continue
+                src.seek(offset)
+                record = src.read(record_size)
+                if record[:KEY_BYTES] != key:
+                    dropped.append((key,))
+                    continue
+                kept.append((dst.tell(), key))
+                dst.write(record)
+        os.replace(tmp_path, self.data_path)
+        self._conn.executemany("DELETE FROM entries WHERE key=?", dropped)
+        self._conn.executemany("UPDATE entries SET offset=? WHERE key=?", kept)
+        self._conn.commit()
+        self.evictions += len(dropped)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide EmbeddingCache in DEFAULT_CACHE_DIR."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
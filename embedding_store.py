@@ -0,0 +1,85 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+import utilities as ut
+
+# Sidecar files live next to the CSV as <name>.<hash16>.emb.npy
+SIDECAR_SUFFIX = ".emb.npy"
+
+
+def parse_embedding_column(series):
+    """
+    Vectorized parse of an embeddings column stored as text like "[0.1 0.2 ...]"
+    (numpy repr, possibly wrapped over several lines) into a float32 matrix.
+    All rows are joined into one buffer and parsed by numpy in a single call.
+    """
+    n_rows = len(series)
+    if n_rows == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    first = series.iloc[0]
+    if not isinstance(first, str):
+        # already parsed (lists / arrays)
+        return np.asarray(series.tolist(), dtype=np.float32)
+
+    text = " ".join(series.astype(str).tolist())
+    text = text.translate(str.maketrans("[],\n", "    "))
+    flat = np.fromstring(text, dtype=np.float32, sep=" ")
+    if flat.size % n_rows != 0:
+        raise ValueError(f"Embedding column has ragged rows ({flat.size} values for {n_rows} rows)")
+    return flat.reshape(n_rows, -1)
+
+
+def sidecar_path(csv_path, csv_hash):
+    base = os.path.splitext(csv_path)[0]
+    return f"{base}.{csv_hash[:16]}{SIDECAR_SUFFIX}"
+
+
+def remove_stale_sidecars(csv_path, keep=None):
+    """Delete sidecars of previous CSV versions (all of them if keep is None)."""
+    base = os.path.splitext(csv_path)[0]
+    for path in glob.glob(glob.escape(base) + ".*" + SIDECAR_SUFFIX):
+        if path != keep:
+            os.remove(path)
+
+
+def load_embedding_matrix(csv_path, data=None, column="embeddings"):
+    """
+    Returns (matrix, csv_hash) for the embeddings column of csv_path.
+
+    The first call parses the column and persists it as a .npy sidecar keyed by
+    the CSV content hash; later calls memory-map the sidecar (zero-copy) instead
+    of re-parsing the text. Pass `data` when the CSV is already loaded to avoid
+    reading it twice on a cache miss.
+    """
+    csv_hash = ut.file_sha256(csv_path)
+    path = sidecar_path(csv_path, csv_hash)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r"), csv_hash
+
+    if data is None:
+        data = pd.read_csv(csv_path, usecols=[column])
+    matrix = parse_embedding_column(data[column])
+
+    # write to a temp name first so a concurrent reader never sees half a file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, path)
+    remove_stale_sidecars(csv_path, keep=path)
+    return np.load(path, mmap_mode="r"), csv_hash
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    # python embedding_store.py User/<name>/<name>.csv
+    csv_path = sys.argv[1]
+    remove_stale_sidecars(csv_path)
+    start = time.perf_counter()
+    matrix, csv_hash = load_embedding_matrix(csv_path)
+    print(f"cold parse: {time.perf_counter()-start:.3f}s shape={matrix.shape}")
+    start = time.perf_counter()
+    matrix, csv_hash = load_embedding_matrix(csv_path)
+    print(f"sidecar load: {time.perf_counter()-start:.3f}s hash={csv_hash[:16]}")
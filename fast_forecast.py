@@ -0,0 +1,158 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+SEASON = 7   # weekly seasonality of daily Google Trends series
+# candidate smoothing parameters, picked per series by one-step-ahead error
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.0, 0.05, 0.2)
+GAMMAS = (0.05, 0.2, 0.5)
+PHI = 0.9    # trend damping, keeps long horizons from running off to 0/100
+# only the most recent days are used to pick parameters and seed the state
+FIT_WINDOW = 365
+METHODS = ("holt_winters", "seasonal_naive")
+
+
+def _clean_values(data):
+    y = pd.to_numeric(data['y'], errors='coerce')
+    return y.interpolate(limit_direction='both').fillna(0).to_numpy(dtype=np.float64)
+
+
+def seasonal_naive(y, horizon, season=SEASON):
+    """Repeat the last full season."""
+    last = y[-season:] if len(y) >= season else np.full(season, y[-1])
+    return np.resize(last, horizon)
+
+
+def _holt_winters_pass(y, alpha, beta, gamma, phi, season):
+    level = y[:season].mean()
+    trend = (y[season:2 * season].mean() - level) / season if len(y) >= 2 * season else 0.0
+    seasonal = list(y[:season] - level)
+    sse = 0.0
+    for t in range(season, len(y)):
+        s = seasonal[t - season]
+        err = y[t] - (level + phi * trend + s)
+        sse += err * err
+        prev_level = level
+        level = alpha * (y[t] - s) + (1 - alpha) * (prev_level + phi * trend)
+        trend = beta * (level - prev_level) + (1 - beta) * phi * trend
+        seasonal.append(gamma * (y[t] - level) + (1 - gamma) * s)
+    return sse, level, trend, np.array(seasonal[-season:])
+
+
+def holt_winters(y, horizon, season=SEASON, phi=PHI):
+    """
+    Additive damped-trend Holt-Winters. alpha/beta/gamma come from a small grid
+    scored on one-step-ahead squared error over the last FIT_WINDOW points.
+    """
+    y = y[-FIT_WINDOW:]
+    if len(y) < 2 * season:
+        return seasonal_naive(y, horizon, season)
+    best = None
+    for alpha in ALPHAS:
+        for beta in BETAS:
+            for gamma in GAMMAS:
+                result = _holt_winters_pass(y, alpha, beta, gamma, phi, season)
+                if best is None or result[0] < best[0]:
+                    best = result
+    _, level, trend, seasonal = best
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(phi ** steps)
+    # seasonal[i] belongs to the i-th day of the last observed season
+    return level + damped * trend + seasonal[(steps - 1) % season]
+
+
+def is_daily(data):
+    """
+    True when data's rows are one day apart (median ds spacing). Google Trends
+    exports of longer ranges are weekly, and the methods here count one row as
+    one day.
+    """
+    ds = pd.to_datetime(data['ds']).dropna().sort_values()
+    if len(ds) < 2:
+        return False
+    return ds.diff().median() == pd.Timedelta(days=1)
+
+
+def forecast(data, until, method="holt_winters"):
+    """
+    Daily yhat Series (indexed by ds) from the day after data's last date up to
+    `until`, same shape as forecast_cache.ProphetCache.forecast. data is a
+    frame with 'ds'/'y' and must be daily (see is_daily).
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    data = data.dropna(subset=['ds']).sort_values('ds')
+    if not is_daily(data):
+        raise ValueError(f"{method} needs a daily series, use the prophet backend for weekly/monthly data")
+    last_date = pd.to_datetime(data['ds'].max())
+    dates = pd.date_range(start=last_date + timedelta(days=1), end=pd.to_datetime(until), freq='D')
+    y = _clean_values(data)
+    fn = holt_winters if method == "holt_winters" else seasonal_naive
+    yhat = fn(y, max(len(dates), 1))[:len(dates)]
+    return pd.Series(np.clip(yhat, 0, 100), index=pd.DatetimeIndex(dates, name='ds'), name='yhat')
+
+
+def read_trend_csv(path):
+    """Google Trends export (category line, then Day,<title> columns) -> ds/y frame."""
+    raw = pd.read_csv(path, skiprows=1)
+    data = pd.DataFrame()
+    data['ds'] = pd.to_datetime(raw.iloc[:, 0], errors='coerce', format='%Y-%m-%d')
+    data['y'] = pd.to_numeric(raw.iloc[:, 1].replace('<1', 0), errors='coerce')
+    return data.dropna(subset=['ds'])
+
+
+def synthetic_series(n_days=730, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_days)
+    y = (40 + 10 * np.sin(2 * np.pi * t / 365) + 12 * np.sin(2 * np.pi * t / 7)
+         + np.cumsum(rng.normal(0, 0.6, n_days)) + rng.normal(0, 4, n_days))
+    return pd.DataFrame({'ds': pd.date_range("2023-01-01", periods=n_days, freq='D'),
+                         'y': np.clip(np.round(y), 0, 100)})
+
+
+def backtest(series, holdouts=(7, 28, 90), backends=("seasonal_naive", "holt_winters", "prophet")):
+    """
+    For every series and holdout length, forecast the held-out tail from the rest
+    and report MAE and runtime per backend (prophet fits bypass the cache).
+    """
+    from forecast_cache import ProphetCache
+    rows = []
+    for name, data in series:
+        data = data.dropna(subset=['ds']).sort_values('ds').reset_index(drop=True)
+        for holdout in holdouts:
+            if len(data) <= holdout + 2 * SEASON:
+                continue
+            train, test = data.iloc[:-holdout], data.iloc[-holdout:]
+            actual = test.set_index('ds')['y'].astype(float)
+            for backend in backends:
+                start = time.perf_counter()
+                if backend == "prophet":
+                    yhat = ProphetCache().forecast(train, test['ds'].max()).clip(0, 100)
+                else:
+                    yhat = forecast(train, test['ds'].max(), method=backend)
+                seconds = time.perf_counter() - start
+                mae = float(np.nanmean(np.abs(yhat.reindex(actual.index).to_numpy() - actual.to_numpy())))
+                rows.append({"series": name, "holdout": holdout, "backend": backend,
+                             "mae": round(mae, 2), "seconds": round(seconds, 4)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # python fast_forecast.py [trend.csv ...]  (synthetic series when no files are given)
+    import os
+    import sys
+    import logging
+    import prophet  # noqa: F401  (configures the cmdstanpy logger, quieted below)
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    paths = sys.argv[1:]
+    if paths:
+        series = [(os.path.basename(p), read_trend_csv(p)) for p in paths]
+    else:
+        series = [(f"synthetic-{seed}", synthetic_series(seed=seed)) for seed in range(5)]
+    results = backtest(series)
+    print(results.to_string(index=False))
+    print()
+    print(results.groupby(["holdout", "backend"])[["mae", "seconds"]].mean().round(4).to_string())
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from llm_cache import SingleFlight
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "prophet")
+# same model get_google_trend has always fitted
+PROPHET_CONFIG = {
+    "growth": "logistic",
+    "yearly_seasonality": True,
+    "weekly_seasonality": True,
+    "daily_seasonality": False,
+}
+CAP = 100
+FLOOR = 0
+# every fit forecasts at least this many days past the series end
+DEFAULT_HORIZON_DAYS = 366
+
+
+def series_key(data, config=PROPHET_CONFIG):
+    """Content hash of a (ds, y) frame plus the Prophet config it is fitted with."""
+    digest = hashlib.sha256()
+    digest.update(data['ds'].to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    digest.update(pd.to_numeric(data['y'], errors='coerce').to_numpy(dtype=np.float64).tobytes())
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _future_frame(start, end):
+    future = pd.DataFrame({'ds': pd.date_range(start=start, end=end, freq='D')})
+    future['cap'] = CAP
+    future['floor'] = FLOOR
+    return future
+
+
+class ProphetCache:
+    """
+    Fitted Prophet models keyed by series_key, each with a daily yhat forecast
+    covering at least horizon_days past the end of its series. Dates inside the
+    forecast are served without touching Prophet; later dates extend the
+    forecast with the cached model (predict only, no refit).
+
+    directory: optional folder where models (prophet json) and forecasts are
+    also written, so fits survive restarts. None keeps everything in memory.
+    """
+    def __init__(self, directory=None, max_entries=64, horizon_days=DEFAULT_HORIZON_DAYS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.horizon_days = horizon_days
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._entries = OrderedDict()   # key -> {"model", "forecast" (Series of yhat by ds)}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.disk_hits = 0
+        self.fits = 0
+        self.extensions = 0
+        self.fit_seconds = 0.0
+
+    def _paths(self, key):
+        return (os.path.join(self.directory, f"{key}.model.json"),
+                os.path.join(self.directory, f"{key}.forecast.csv"))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        model_path, forecast_path = self._paths(key)
+        if not (os.path.exists(model_path) and os.path.exists(forecast_path)):
+            return None
+        from prophet.serialize import model_from_json
+        with open(model_path) as f:
+            model = model_from_json(f.read())
+        forecast = pd.read_csv(forecast_path, parse_dates=['ds']).set_index('ds')['yhat']
+        return {"model": model, "forecast": forecast}
+
+    def _save(self, key, entry, model_changed=True):
+        if not self.directory:
+            return
+        model_path, forecast_path = self._paths(key)
+        if model_changed:
+            from prophet.serialize import model_to_json
+            tmp = model_path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(model_to_json(entry["model"]))
+            os.replace(tmp, model_path)
+        tmp = forecast_path + ".tmp"
+        entry["forecast"].reset_index().to_csv(tmp, index=False)
+        os.replace(tmp, forecast_path)
+
+    def _fit(self, data, config, until):
+        from prophet import Prophet
+        start = time.perf_counter()
+        train = data[['ds', 'y']].copy()
+        train['cap'] = CAP
+        train['floor'] = FLOOR
+        model = Prophet(**config)
+        model.fit(train)
+        last_date = pd.to_datetime(data['ds'].max())
+        end = max(until, last_date + timedelta(days=self.horizon_days))
+        forecast = model.predict(_future_frame(last_date + timedelta(days=1), end)).set_index('ds')['yhat']
+        with self._lock:
+            self.fits += 1
+            self.fit_seconds += time.perf_counter() - start
+        return {"model": model, "forecast": forecast}
+
+    def _extend(self, entry, until):
+        forecast = entry["forecast"]
+        extra = entry["model"].predict(_future_frame(forecast.index.max() + timedelta(days=1), until))
+        with self._lock:
+            self.extensions += 1
+        return {"model": entry["model"], "forecast": pd.concat([forecast, extra.set_index('ds')['yhat']])}
+
+    def forecast(self, data, until, config=PROPHET_CONFIG):
+        """
+        Daily yhat Series (indexed by ds) starting the day after data's last
+        date and reaching at least `until`. data is a frame with 'ds'/'y'.
+        """
+        until = pd.to_datetime(until)
+        key = series_key(data, config)
+
+        def resolve():
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+            else:
+                entry = self._load(key)
+                if entry is not None:
+                    with self._lock:
+                        self.disk_hits += 1
+            if entry is None:
+                entry = self._fit(data, config, until)
+                self._save(key, entry)
+            elif entry["forecast"].index.max() < until:
+                entry = self._extend(entry, until)
+                self._save(key, entry, model_changed=False)
+            self._remember(key, entry)
+            return entry["forecast"]
+
+        forecast = self._flight.do(key, resolve)
+        while forecast.index.max() < until:
+            # joined a fit led by a caller with an earlier `until`: the entry
+            # is cached now, so resolving again only extends it
+            forecast = self._flight.do(key, resolve)
+        return forecast
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "fits": self.fits,
+                "extensions": self.extensions,
+                "fit_seconds": round(self.fit_seconds, 3),
+            }
+
+
+# Process-wide cache; PROPHET_DISK_CACHE=1 also keeps fits in .cache/prophet
+prophet_cache = ProphetCache(directory=DEFAULT_CACHE_DIR if os.environ.get("PROPHET_DISK_CACHE", "0") == "1" else None)
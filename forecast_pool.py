@@ -0,0 +1,212 @@
+import os
+import time
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TIMEOUT = 120   # seconds per series
+STARTUP_TIMEOUT = 60    # seconds for a worker to import and report ready
+COLUMNS = ['Title', 'Date', 'Hype_Score', 'Fit_Seconds', 'Status']
+
+
+def _worker_main(conn):
+    """Worker loop: (task_id, title, data_csv, dates, backend) in, (task_id, scores, seconds, error) out."""
+    from trend_score_compute import get_google_trend
+    conn.send("ready")
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        task_id, title, data_csv, dates, backend = task
+        start = time.perf_counter()
+        try:
+            scores = get_google_trend(title, dates, data_csv, backend=backend)
+            error = None
+        except Exception as e:
+            scores, error = None, f"{type(e).__name__}: {e}"
+        conn.send((task_id, scores, time.perf_counter() - start, error))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.spawned = time.perf_counter()
+        self.ready = False    # imports done, timeouts only count from here
+        self.task = None      # task id being run
+        self.started = None
+
+    def submit(self, task_id, payload):
+        self.task = task_id
+        self.started = time.perf_counter()
+        self.conn.send((task_id,) + payload)
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(5)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class ForecastPool:
+    """
+    Scores many trend series in worker processes with get_google_trend.
+
+    At most max_workers series run at once; a series still running after
+    `timeout` seconds has its worker killed (and replaced while series are
+    still queued), and is reported with Status 'timeout' instead of holding up
+    the rest. A worker that does not start within startup_timeout seconds is
+    dropped; the run fails only when no worker starts at all. Workers live for
+    one run() so each keeps its own Prophet cache across the series it handles.
+    """
+    def __init__(self, max_workers=None, timeout=DEFAULT_TIMEOUT, start_method="spawn",
+                 startup_timeout=STARTUP_TIMEOUT):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 1) - 1))
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self._ctx = mp.get_context(start_method)
+
+    def run(self, series, dates, backend="auto"):
+        """
+        series: {title: Google Trends DataFrame (or TrendSeries)}; dates: list of
+        'YYYY-MM-DD'. Returns one frame with a row per (title, date): Title, Date,
+        Hype_Score (NaN when the series failed), Fit_Seconds (wall time of the
+        whole series) and Status ('ok', 'timeout' or the error).
+        """
+        dates = list(dates)
+        tasks = list(series.items())
+        outcome = {}    # task id -> (scores, seconds, status)
+        pending = list(range(len(tasks)))[::-1]
+        workers = []
+        try:
+            for _ in range(min(self.max_workers, len(tasks))):
+                workers.append(_Worker(self._ctx))
+            while len(outcome) < len(tasks):
+                for worker in workers:
+                    if worker.ready and worker.task is None and pending:
+                        task_id = pending.pop()
+                        title, data_csv = tasks[task_id]
+                        worker.submit(task_id, (title, data_csv, dates, backend))
+
+                busy = [w for w in workers if w.task is not None]
+                starting = [w for w in workers if not w.ready]
+                deadlines = ([w.started + self.timeout for w in busy]
+                             + [w.spawned + self.startup_timeout for w in starting])
+                wait_for = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else None
+                ready = wait([w.conn for w in busy + starting], timeout=wait_for)
+
+                survivors = []
+                for worker in workers:
+                    if not worker.ready:
+                        started = False
+                        if worker.conn in ready:
+                            try:
+                                started = worker.ready = worker.conn.recv() == "ready"
+                            except EOFError:
+                                pass
+                        if started:
+                            survivors.append(worker)
+                        elif worker.conn in ready or time.perf_counter() - worker.spawned >= self.startup_timeout:
+                            # crashed or hung while importing, carry on with the others
+                            print(f"forecast worker {worker.process.pid} failed to start, dropping it")
+                            worker.kill()
+                        else:
+                            survivors.append(worker)
+                        continue
+                    if worker.task is None:
+                        survivors.append(worker)
+                        continue
+                    if worker.conn in ready:
+                        try:
+                            task_id, scores, seconds, error = worker.conn.recv()
+                        except EOFError:
+                            # worker died (e.g. out of memory)
+                            outcome[worker.task] = (None, time.perf_counter() - worker.started, "error: worker exited")
+                            worker.kill()
+                            if pending:
+                                survivors.append(_Worker(self._ctx))
+                            continue
+                        outcome[task_id] = (scores, seconds, "ok" if error is None else f"error: {error}")
+                        worker.task = None
+                        survivors.append(worker)
+                    elif time.perf_counter() - worker.started >= self.timeout:
+                        outcome[worker.task] = (None, time.perf_counter() - worker.started, "timeout")
+                        worker.kill()
+                        if pending:
+                            survivors.append(_Worker(self._ctx))
+                    else:
+                        survivors.append(worker)
+                workers[:] = survivors
+                if not workers and len(outcome) < len(tasks):
+                    raise RuntimeError("no forecast worker could be started")
+        finally:
+            for worker in workers:
+                worker.close()
+
+        frames = []
+        for task_id, (title, _) in enumerate(tasks):
+            scores, seconds, status = outcome[task_id]
+            frames.append(pd.DataFrame({
+                'Title': title,
+                'Date': dates,
+                'Hype_Score': scores if scores is not None else np.nan,
+                'Fit_Seconds': round(seconds, 3),
+                'Status': status,
+            }, columns=COLUMNS))
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def fit_times(results):
+        """Per-series Fit_Seconds and Status from a run() frame, slowest first."""
+        return (results.groupby('Title', sort=False)[['Fit_Seconds', 'Status']].first()
+                .sort_values('Fit_Seconds', ascending=False))
+
+
+def forecast_many(series, dates, backend="auto", max_workers=None, timeout=DEFAULT_TIMEOUT):
+    """ForecastPool(max_workers, timeout).run(series, dates, backend)."""
+    return ForecastPool(max_workers=max_workers, timeout=timeout).run(series, dates, backend=backend)
+
+
+if __name__ == "__main__":
+    # python forecast_pool.py [n_series] [workers]: synthetic series, serial vs pool
+    import sys
+    import fast_forecast
+    from trend_score_compute import get_google_trend
+    n_series = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    series = {}
+    for seed in range(n_series):
+        data = fast_forecast.synthetic_series(seed=seed)
+        series[f"title-{seed}"] = pd.DataFrame({'Day': data['ds'].dt.strftime('%Y-%m-%d'), 'value': data['y']})
+    last = pd.Timestamp("2023-01-01") + pd.Timedelta(days=729)
+    dates = pd.date_range(last + pd.Timedelta(days=1), periods=60, freq='D').strftime('%Y-%m-%d').tolist()
+
+    start = time.perf_counter()
+    for title, data_csv in series.items():
+        get_google_trend(title, dates, data_csv, backend="prophet")
+    serial = time.perf_counter() - start
+
+    pool = ForecastPool(max_workers=n_workers)
+    start = time.perf_counter()
+    results = pool.run(series, dates, backend="prophet")
+    pooled = time.perf_counter() - start
+    print(ForecastPool.fit_times(results).to_string())
+    print(f"{n_series} series x {len(dates)} dates: serial {serial:.2f}s, pool ({pool.max_workers} workers) {pooled:.2f}s")
@@ -1,10 +1,10 @@
 import imdb
-from sentence_transformers import SentenceTransformer
 import synopsis_gen as sgen
+import embedder_service
 
-# Create IMDb and SentenceTransformer once
+# Create IMDb once, the sentence embedder is shared and loads on first use
 ia = imdb.IMDb()
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+embedder = embedder_service.get_embedder("all-MiniLM-L6-v2")
 
 def get_movie_synopsis_embedding(movie_name,embedder):
     """
@@ -0,0 +1,418 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import traceback
+import subprocess
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DB = "jobs.db"
+ACTIVE = ("pending", "running")
+HEARTBEAT_SECONDS = 5
+# a running job or worker without a heartbeat for this long is considered dead
+STALE_SECONDS = 60
+# progress writes closer together than this are coalesced
+PROGRESS_INTERVAL = 1.0
+WORKER_LOG = os.path.join(".cache", "jobs", "worker.log")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict("records")
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, sort_keys=True)
+
+
+def dedup_key(kind, args):
+    return hashlib.sha256(f"{kind}\0{_dumps(args)}".encode("utf-8")).hexdigest()
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of background jobs (training, accuracy evaluation,
+    forecasting) shared by the app and the worker processes.
+
+    A job is pending -> running -> done | failed. Enqueueing a job identical
+    (same kind and args) to one still pending or running returns the existing
+    job instead. Workers write progress, free-form details (epoch, losses, ...)
+    and the JSON result back into the row, so any page can poll it.
+    """
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, kind TEXT NOT NULL, args TEXT NOT NULL, dedup_key TEXT NOT NULL, "
+            "status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, details TEXT, "
+            "result TEXT, error TEXT, worker_pid INTEGER, created REAL NOT NULL, started REAL, "
+            "finished REAL, heartbeat REAL)"
+        )
+        # at most one active job per (kind, args)
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_active ON jobs (dedup_key) WHERE status IN ('pending', 'running')"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers (pid INTEGER PRIMARY KEY, started REAL NOT NULL, heartbeat REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+
+    # ---- app side ----
+    def enqueue(self, kind, args):
+        """Queue a job and return its id (the id of the identical active job, if any)."""
+        if kind not in TASKS:
+            raise ValueError(f"unknown job kind {kind!r}, expected one of {sorted(TASKS)}")
+        key = dedup_key(kind, args)
+        attempts = 3
+        while True:
+            # the lookup and the insert share one write transaction, so no other
+            # writer can add or finish the duplicate in between
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT id FROM jobs WHERE dedup_key=? AND status IN ('pending', 'running')", (key,)
+                    ).fetchone()
+                    if row is None:
+                        row = (self._conn.execute(
+                            "INSERT INTO jobs (kind, args, dedup_key, status, created) VALUES (?, ?, ?, 'pending', ?)",
+                            (kind, _dumps(args), key, time.time()),
+                        ).lastrowid,)
+                    self._conn.execute("COMMIT")
+                    return row[0]
+                except sqlite3.IntegrityError:
+                    self._conn.execute("ROLLBACK")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            # retried outside the (non-reentrant) lock
+            attempts -= 1
+            if not attempts:
+                raise RuntimeError(f"could not enqueue {kind} job after repeated conflicts")
+
+    def _decode(self, row, columns):
+        job = dict(zip(columns, row))
+        for name in ("args", "details", "result"):
+            if job.get(name) is not None:
+                job[name] = json.loads(job[name])
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id=?", (int(job_id),))
+            row = cursor.fetchone()
+            columns = [c[0] for c in cursor.description]
+        return self._decode(row, columns) if row is not None else None
+
+    def list(self, status=None, kind=None, limit=50):
+        """Newest jobs first, optionally filtered, without their results."""
+        query = ("SELECT id, kind, args, status, progress, message, details, error, created, started, finished "
+                 "FROM jobs WHERE 1=1")
+        params = []
+        if status is not None:
+            query += " AND status=?"
+            params.append(status)
+        if kind is not None:
+            query += " AND kind=?"
+            params.append(kind)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            rows = cursor.fetchall()
+            columns = [c[0] for c in cursor.description]
+        return [self._decode(row, columns) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet; returns whether it was cancelled."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status='failed', error='cancelled', finished=? WHERE id=? AND status='pending'",
+                (time.time(), int(job_id)),
+            )
+            return cursor.rowcount == 1
+
+    # ---- worker side ----
+    def claim(self, pid):
+        """Mark the oldest pending job running for worker pid and return it, or None."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # jobs whose worker died are failed rather than retried blindly
+                self._conn.execute(
+                    "UPDATE jobs SET status='failed', error='worker stopped responding', finished=? "
+                    "WHERE status='running' AND heartbeat < ?", (now, now - STALE_SECONDS),
+                )
+                row = self._conn.execute("SELECT id FROM jobs WHERE status='pending' ORDER BY id LIMIT 1").fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status='running', worker_pid=?, started=?, heartbeat=? WHERE id=?",
+                        (pid, now, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def report(self, job_id, progress=None, message=None, details=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress=COALESCE(?, progress), message=COALESCE(?, message), "
+                "details=COALESCE(?, details), heartbeat=? WHERE id=?",
+                (progress, message, _dumps(details) if details is not None else None, time.time(), int(job_id)),
+            )
+
+    def finish(self, job_id, result):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status='done', progress=1, result=?, finished=?, heartbeat=? WHERE id=?",
+                (_dumps(result), time.time(), time.time(), int(job_id)),
+            )
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status='failed', error=?, finished=? WHERE id=?",
+                (error, time.time(), int(job_id)),
+            )
+
+    def heartbeat(self, pid, job_id=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (pid, started, heartbeat) VALUES (?, ?, ?) "
+                "ON CONFLICT(pid) DO UPDATE SET heartbeat=excluded.heartbeat", (pid, now, now),
+            )
+            if job_id is not None:
+                self._conn.execute("UPDATE jobs SET heartbeat=? WHERE id=?", (now, int(job_id)))
+
+    def unregister(self, pid):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE pid=?", (pid,))
+
+    def live_workers(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (time.time() - STALE_SECONDS,)
+            ).fetchone()[0]
+
+    def claim_launch(self):
+        """
+        True for exactly one caller when no worker is alive and no pool was
+        launched in the last STALE_SECONDS, so concurrent sessions start one pool.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                alive = self._conn.execute(
+                    "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (now - STALE_SECONDS,)
+                ).fetchone()[0]
+                launched = self._conn.execute("SELECT value FROM meta WHERE key='pool_launched'").fetchone()
+                if alive or (launched is not None and launched[0] >= now - STALE_SECONDS):
+                    self._conn.execute("COMMIT")
+                    return False
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('pool_launched', ?)", (now,))
+                self._conn.execute("COMMIT")
+                return True
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+# ---- tasks: handler(args, report) -> JSON-serializable result ----
+def _epoch_reporter(report):
+    def callback(epoch, epochs, train_loss, val_loss):
+        report(progress=epoch / epochs, message=f"epoch {epoch}/{epochs}",
+               details={"epoch": epoch, "epochs": epochs, "train_loss": train_loss, "val_loss": val_loss})
+    return callback
+
+
+def _task_train(args, report):
+    """Full training run; through train_if_changed so the dataset snapshot stays current."""
+    import model_work as mt
+    return mt.train_if_changed(args["parent_directory"], args["name_of_dataset"], force_full=True,
+                               progress_callback=_epoch_reporter(report), **args.get("train_kwargs", {}))
+
+
+def _task_retrain(args, report):
+    """train_if_changed, then re-score the popular cached predictions if the model changed."""
+    import model_work as mt
+    metadata = mt.train_if_changed(args["parent_directory"], args["name_of_dataset"],
+                                   progress_callback=_epoch_reporter(report), **args.get("train_kwargs", {}))
+    if metadata["training_mode"] != "skipped" and args.get("user_name"):
+        report(message="re-scoring cached predictions")
+        metadata["rescored"] = mt.rescore_top_predictions(args["parent_directory"], args["user_name"])
+    return metadata
+
+
+def _task_metric_eval(args, report):
+    import metric_eval
+    import utilities as ut
+    def callback(done, total, movie):
+        report(progress=done / max(1, total), message=f"checking {movie} ({done + 1}/{total})")
+    me = metric_eval.metric_eval(ut.cache_memory(args["user_name"]).export_csv())
+    return me.calculate_metrics(flag=args.get("flag", "Accuracy"), progress_callback=callback)
+
+
+def _task_forecast(args, report):
+    """Trend scores of stored titles for dates, through forecast_pool."""
+    import forecast_pool
+    from trend_store import open_trend_store
+    series = open_trend_store(args["parent_directory"]).get_many(args["titles"])
+    report(message=f"forecasting {len(series)} series")
+    results = forecast_pool.forecast_many(series, args["dates"], backend=args.get("backend", "auto"),
+                                          max_workers=args.get("max_workers"))
+    return {"scores": results, "fit_times": forecast_pool.ForecastPool.fit_times(results).reset_index()}
+
+
+def _task_bulk_retrain(args, report):
+    """Every user's model through bulk_retrain (its own process pool), resuming an interrupted run."""
+    import bulk_retrain
+    def callback(done, total, row):
+        report(progress=done / max(1, total), message=f"{row['User']}: {row['Status']} ({done}/{total})")
+    bulk = bulk_retrain.BulkRetrain(args.get("root", bulk_retrain.USER_ROOT), max_workers=args.get("max_workers"),
+                                    full=args.get("full", False), train_kwargs=args.get("train_kwargs"))
+    return bulk.run(resume=True, progress_callback=callback)
+
+
+TASKS = {
+    "train": _task_train,
+    "retrain": _task_retrain,
+    "metric_eval": _task_metric_eval,
+    "forecast": _task_forecast,
+    "bulk_retrain": _task_bulk_retrain,
+}
+
+
+def _run_job(queue, job, pid):
+    last_write = [0.0]
+    dropped = [None]   # latest throttled update, written before the job ends
+
+    def report(progress=None, message=None, details=None):
+        # epoch callbacks can fire thousands of times, keep the writes cheap
+        now = time.perf_counter()
+        if progress is not None and now - last_write[0] < PROGRESS_INTERVAL:
+            dropped[0] = (progress, message, details)
+            return
+        last_write[0] = now
+        dropped[0] = None
+        queue.report(job["id"], progress, message, details)
+
+    def flush():
+        if dropped[0] is not None:
+            queue.report(job["id"], *dropped[0])
+            dropped[0] = None
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            queue.heartbeat(pid, job["id"])
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    try:
+        result = TASKS[job["kind"]](job["args"], report)
+        flush()
+        queue.finish(job["id"], result)
+    except Exception as e:
+        traceback.print_exc()
+        flush()
+        queue.fail(job["id"], f"{type(e).__name__}: {e}")
+    finally:
+        stop.set()
+        beater.join()
+
+
+def worker_loop(path=DEFAULT_DB, poll_seconds=1.0, max_jobs=None):
+    """Claim and run jobs until interrupted (or after max_jobs jobs)."""
+    queue = JobQueue(path)
+    pid = os.getpid()
+    done = 0
+    try:
+        while max_jobs is None or done < max_jobs:
+            queue.heartbeat(pid)
+            job = queue.claim(pid)
+            if job is None:
+                time.sleep(poll_seconds)
+                continue
+            print(f"[worker {pid}] job {job['id']} ({job['kind']}) started", flush=True)
+            _run_job(queue, job, pid)
+            print(f"[worker {pid}] job {job['id']} finished", flush=True)
+            done += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.unregister(pid)
+
+
+def run_pool(n_workers=2, path=DEFAULT_DB):
+    """Run n_workers worker_loop processes in the foreground until interrupted."""
+    ctx = mp.get_context("spawn")
+    processes = [ctx.Process(target=worker_loop, args=(path,)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def ensure_workers(n_workers=2, path=DEFAULT_DB):
+    """
+    Start a detached worker pool (python job_queue.py worker) when none is
+    alive, so queued jobs survive the Streamlit session that submitted them.
+    Returns True if a pool was launched.
+    """
+    queue = JobQueue(path)
+    if not queue.claim_launch():
+        return False
+    os.makedirs(os.path.dirname(WORKER_LOG), exist_ok=True)
+    with open(WORKER_LOG, "a") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "worker", str(n_workers), "--db", os.path.abspath(path)],
+            stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, start_new_session=True,
+        )
+    return True
+
+
+if __name__ == "__main__":
+    # python job_queue.py worker [n_workers] [--db jobs.db]
+    # python job_queue.py list [--db jobs.db]
+    argv = sys.argv[1:]
+    db = DEFAULT_DB
+    if "--db" in argv:
+        i = argv.index("--db")
+        db = argv[i + 1]
+        del argv[i:i + 2]
+    command = argv[0] if argv else "worker"
+    if command == "worker":
+        run_pool(int(argv[1]) if len(argv) > 1 else 2, db)
+    elif command == "list":
+        for job in JobQueue(db).list():
+            print(f"{job['id']:>5} {job['kind']:<12} {job['status']:<8} {job['progress']:.0%} {job['message'] or ''} {job['error'] or ''}")
+    else:
+        raise SystemExit(f"unknown command {command}")
@@ -0,0 +1,184 @@
+import re
+import time
+import unicodedata
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Unigrams plus adjacent-word bigrams, so full names ("greta gerwig") outrank partial ones."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    words = TOKEN_PATTERN.findall(text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring over the catalogue texts.
+    Postings are kept as numpy arrays so a query is a handful of vector ops
+    per query term; documents added after a search are folded in lazily.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._doc_ids = []
+        self._doc_lengths = []
+        self._pending = {}     # term -> ([doc positions], [term frequencies])
+        self._postings = {}    # term -> (positions array, tf array)
+        self._dirty = False
+
+    @classmethod
+    def from_items(cls, items, **kwargs):
+        """Build from (doc_id, text) pairs, e.g. MovieMetadataStore.items()."""
+        index = cls(**kwargs)
+        for doc_id, text in items:
+            index.add(doc_id, text)
+        return index
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def add(self, doc_id, text):
+        position = len(self._doc_ids)
+        tokens = tokenize(text)
+        self._doc_ids.append(doc_id)
+        self._doc_lengths.append(len(tokens))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            positions, tfs = self._pending.setdefault(token, ([], []))
+            positions.append(position)
+            tfs.append(tf)
+        self._dirty = True
+
+    def _finalize(self):
+        for term, (positions, tfs) in self._pending.items():
+            if term in self._postings:
+                old_positions, old_tfs = self._postings[term]
+                positions = np.concatenate([old_positions, positions])
+                tfs = np.concatenate([old_tfs, tfs])
+            self._postings[term] = (np.asarray(positions, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+        self._pending = {}
+        self._doc_id_array = np.asarray(self._doc_ids, dtype=np.int64)
+        lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+        self._length_norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        self._dirty = False
+
+    def search(self, query, k=10, allowed_ids=None):
+        """Top-k [(doc_id, bm25 score)] for query; allowed_ids restricts the candidates."""
+        if self._dirty:
+            self._finalize()
+        n_docs = len(self._doc_ids)
+        if n_docs == 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            positions, tfs = self._postings[term]
+            idf = np.log(1 + (n_docs - len(positions) + 0.5) / (len(positions) + 0.5))
+            scores[positions] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[positions])
+        if allowed_ids is not None:
+            scores[~np.isin(self._doc_id_array, np.asarray(list(allowed_ids), dtype=np.int64))] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(self._doc_id_array[i]), float(scores[i])) for i in candidates]
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=60):
+    """
+    Fuse several ranked id lists (best first) with RRF: sum of w / (k + rank).
+    Returns [(id, fused score)] best first and the best score attainable, so
+    callers can normalise to 0..1.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])
+    return ordered, sum(weights) / (k + 1)
+
+
+FIRST_NAMES = ["Christopher", "Greta", "Denis", "Sofia", "Martin", "Kathryn", "Bong", "Jordan", "Ridley", "Ava",
+               "Wes", "Chloe", "Spike", "Jane", "Paul", "Lynne", "Guillermo", "Agnes", "Akira", "Celine"]
+LAST_NAMES = ["Nolan", "Gerwig", "Villeneuve", "Coppola", "Scorsese", "Bigelow", "Joon-ho", "Peele", "Scott",
+              "DuVernay", "Anderson", "Zhao", "Lee", "Campion", "Thomas", "Ramsay", "Toro", "Varda", "Kurosawa", "Sciamma"]
+SUMMARY_WORDS = ["a", "young", "detective", "family", "war", "love", "city", "secret", "journey", "heist", "space",
+                 "crew", "haunted", "house", "revenge", "small", "town", "future", "robot", "island", "murder"]
+
+
+def synthetic_corpus(n_docs=20000, seed=0):
+    """Corpus in the ask_gemini_similarity layout plus the relevant doc ids per person name."""
+    rng = np.random.default_rng(seed)
+    people = [f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES]
+    genres = ["Sci-Fi", "Drama", "Comedy", "Horror", "Thriller", "Romance", "Action", "War"]
+    corpus, relevant = [], {}
+    for doc_id in range(n_docs):
+        cast = list(rng.choice(people, 4, replace=False))
+        summary = " ".join(rng.choice(SUMMARY_WORDS, 20))
+        corpus.append(f"-Title {doc_id}\n-{summary}\n-{', '.join(rng.choice(genres, 2, replace=False))}\n"
+                      f"-{', '.join(cast[1:])}\n-{cast[0]}\n-{1970 + doc_id % 55}\n-Studio {doc_id % 40}")
+        for person in cast:
+            relevant.setdefault(person, set()).add(doc_id)
+    return corpus, relevant
+
+
+def benchmark(n_docs=20000, n_queries=200, k=10, with_vectors=False):
+    """
+    Name queries against a synthetic corpus: BM25 build time, query latency and
+    recall@k. with_vectors=True also embeds the corpus (shared embedder) and
+    reports vector-only and fused (RRF) recall for the same queries.
+    """
+    corpus, relevant = synthetic_corpus(n_docs)
+    start = time.perf_counter()
+    bm25 = BM25Index.from_items(enumerate(corpus))
+    bm25.search("warm up")
+    build_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    names = list(rng.choice(sorted(relevant), n_queries, replace=False))
+
+    def recall(ranked_ids, name):
+        truth = relevant[name]
+        return len(set(ranked_ids[:k]) & truth) / min(k, len(truth))
+
+    latencies, lexical_rankings = [], []
+    for name in names:
+        start = time.perf_counter()
+        hits = bm25.search(name, k=max(k, 50))
+        latencies.append((time.perf_counter() - start) * 1000)
+        lexical_rankings.append([doc_id for doc_id, _ in hits])
+    results = {
+        "docs": n_docs,
+        "bm25_build_s": round(build_s, 3),
+        "bm25_query_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "bm25_query_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        f"bm25_recall@{k}": round(float(np.mean([recall(r, n) for r, n in zip(lexical_rankings, names)])), 4),
+    }
+
+    if with_vectors:
+        import faiss
+        import embedder_service
+        embedder = embedder_service.get_embedder()
+        vectors = np.asarray(embedder.encode(corpus, normalize_embeddings=True), dtype="float32")
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        query_vectors = np.asarray(embedder.encode(names, normalize_embeddings=True), dtype="float32")
+        _, found = index.search(query_vectors, max(k, 50))
+        vector_rankings = [list(row) for row in found]
+        fused = [[doc_id for doc_id, _ in reciprocal_rank_fusion([v, l])[0]] for v, l in zip(vector_rankings, lexical_rankings)]
+        results[f"vector_recall@{k}"] = round(float(np.mean([recall(r, n) for r, n in zip(vector_rankings, names)])), 4)
+        results[f"hybrid_recall@{k}"] = round(float(np.mean([recall(r, n) for r, n in zip(fused, names)])), 4)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    # python lexical_search.py [n_docs] [--vectors]
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 20000
+    print(benchmark(n_docs=n_docs, with_vectors="--vectors" in sys.argv))
@@ -0,0 +1,171 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm", "responses.db")
+DEFAULT_TTL = 7 * 24 * 3600   # seconds
+# responses that signal a failed generation are never cached
+UNCACHEABLE = {"No response generated."}
+
+
+class ResponseCache:
+    """Persistent (model, prompt) -> response text store with a TTL."""
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, prompt):
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model, prompt):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key=?", (self.key(model, prompt),)
+            ).fetchone()
+            if row is not None and time.time() - row[1] <= self.ttl:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, model, prompt, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (self.key(model, prompt), model, response, time.time()),
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution of fn."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> [Event, result, error]
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = [threading.Event(), None, None]
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+
+class LocalStubClient:
+    """Offline stand-in for the Gemini client, for tests and benchmarks."""
+    name = "local-stub"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return f"[{model} stub] {prompt.splitlines()[-1][:200]}"
+
+
+_cache = None
+_flight = SingleFlight()
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide ResponseCache in DEFAULT_CACHE_PATH."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def client_name(client):
+    """Identity a client's responses are cached under (its `name`, else its class name)."""
+    return getattr(client, "name", None) or type(client).__name__
+
+
+def cached_generate(client, model, prompt, cache=None, flight=None):
+    """
+    client.generate(model, prompt) behind the response cache and single-flight.
+    Responses are cached per client (client.name), so a stub's canned answers
+    are never served for the real backend. Exceptions are propagated to every
+    waiting caller and never cached.
+    """
+    cache = cache if cache is not None else get_cache()
+    flight = flight if flight is not None else _flight
+    # the cache and flight key the response by "<client name>/<model>"
+    model_key = f"{client_name(client)}/{model}"
+
+    response = cache.get(model_key, prompt)
+    if response is not None:
+        return response
+
+    def call():
+        # another flight may have filled the cache while we queued for the lock
+        cached = cache.get(model_key, prompt)
+        if cached is not None:
+            return cached
+        result = client.generate(model, prompt)
+        if result not in UNCACHEABLE:
+            cache.put(model_key, prompt, result)
+        return result
+
+    return flight.do(ResponseCache.key(model_key, prompt), call)
+
+
+if __name__ == "__main__":
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    stub = LocalStubClient(latency=0.3)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ResponseCache(os.path.join(tmp_dir, "responses.db"))
+        flight = SingleFlight()
+        prompts = [f"Give me summary of this movie: Movie {i % 5}" for i in range(100)]
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                list(pool.map(lambda p: cached_generate(stub, "gemini-2.5-flash", p, cache, flight), prompts))
+            print(f"{label}: 100 prompts (5 distinct) in {time.perf_counter()-start:.2f}s, "
+                  f"client calls so far: {stub.calls}, shared in-flight: {flight.shared}, "
+                  f"cache hits: {cache.hits}")
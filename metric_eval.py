@@ -25,7 +25,11 @@ class metric_eval:
         self.options.add_argument("--disable-gpu")  # Extra for cloud stability
         self.options.add_argument("--remote-debugging-port=9222")  # For containerized envs
 
-    def calculate_metrics(self, flag='Accuracy'):
+    def calculate_metrics(self, flag='Accuracy', progress_callback=None):
+        """
+        progress_callback, if given, is called as progress_callback(done, total, movie)
+        before each movie is looked up.
+        """
         df = pd.read_csv(self.data_url)
         pred_movies = df['Title'].tolist()
 
@@ -33,7 +37,9 @@ class metric_eval:
         unsuccessful_movies = []
         final_results = {}
 
-        for mov in pred_movies:
+        for i, mov in enumerate(pred_movies):
+            if progress_callback is not None:
+                progress_callback(i, len(pred_movies), mov)
             print(f"Started for movie {mov}")
             url = f"https://www.youtube.com/@VKunia/search?query={mov.replace(' ', '%20')}"
 
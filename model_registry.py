@@ -0,0 +1,211 @@
+import io
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import joblib
+import torch
+import utilities as ut
+from view_predictor import ViewPredictor
+from compiled_model import CompiledViewPredictor, COMPILED_FILE
+
+
+class ModelArtifacts:
+    """Everything model_inference needs for one user, loaded once."""
+    def __init__(self, preprocessor, model, metadata, size_bytes, compiled=None, version=None):
+        self.preprocessor = preprocessor
+        self.model = model
+        self.metadata = metadata
+        self.size_bytes = size_bytes
+        # CompiledViewPredictor when an up-to-date compiled.npz exists
+        self.compiled = compiled
+        # model_version() of the files this was loaded from, keys cached predictions
+        self.version = version
+
+
+def artifact_paths(parent_directory, user_name):
+    return {
+        "model": os.path.join(parent_directory, "model.pth"),
+        "preprocessor": os.path.join(parent_directory, "preprocessor.pkl"),
+        "metadata": os.path.join(parent_directory, f"{user_name}.json"),
+        "compiled": os.path.join(parent_directory, COMPILED_FILE),
+    }
+
+
+def version_from_hashes(model_hash, preprocessor_hash, dataset_path):
+    """model_version() from already computed model.pth / preprocessor.pkl hashes (None if missing)."""
+    digest = hashlib.sha256()
+    dataset_hash = ut.file_sha256(dataset_path) if os.path.exists(dataset_path) else None
+    for file_hash in (model_hash, preprocessor_hash, dataset_hash):
+        if file_hash:
+            digest.update(file_hash.encode("ascii"))
+    return digest.hexdigest()[:16]
+
+
+def model_version(parent_directory, dataset_path):
+    """
+    Version id of a trained model: sha256 over the content hashes of model.pth,
+    preprocessor.pkl and the training dataset (first 16 hex chars). Retraining,
+    or training on a different dataset, gives a new id.
+    """
+    hashes = [ut.file_sha256(path) if os.path.exists(path) else None
+              for path in (os.path.join(parent_directory, "model.pth"),
+                           os.path.join(parent_directory, "preprocessor.pkl"))]
+    return version_from_hashes(*hashes, dataset_path)
+
+
+def publish_artifacts(parent_directory, metadata_path, state_dict, preprocessor, metadata, dataset_path):
+    """
+    Write model.pth, preprocessor.pkl and the metadata json of a finished
+    training run. Weights and preprocessor go to temp files first and are
+    swapped in with os.replace, the metadata last, so a reader never sees a
+    half-written file. The metadata records model_source (the hashes of the
+    published files) and the model_version computed from them.
+    Returns the metadata as written.
+    """
+    paths = {"model": os.path.join(parent_directory, "model.pth"),
+             "preprocessor": os.path.join(parent_directory, "preprocessor.pkl")}
+    tmp = {name: f"{path}.{os.getpid()}.tmp" for name, path in paths.items()}
+    torch.save(state_dict, tmp["model"])
+    joblib.dump(preprocessor, tmp["preprocessor"])
+    model_hash = ut.file_sha256(tmp["model"])
+    preprocessor_hash = ut.file_sha256(tmp["preprocessor"])
+    metadata = dict(metadata, model_source=model_hash + preprocessor_hash,
+                    model_version=version_from_hashes(model_hash, preprocessor_hash, dataset_path))
+    for name, path in paths.items():
+        os.replace(tmp[name], path)
+    with open(metadata_path + ".tmp", "w") as f:
+        json.dump(metadata, f, skipkeys=True)
+    os.replace(metadata_path + ".tmp", metadata_path)
+    return metadata
+
+
+def load_artifacts(parent_directory, user_name, device="cpu"):
+    """Deserialize preprocessor, model weights and metadata from disk."""
+    paths = artifact_paths(parent_directory, user_name)
+    with open(paths["metadata"], "r") as f:
+        metadata = json.load(f)
+    # read each file once, so the version below describes exactly what was loaded
+    with open(paths["model"], "rb") as f:
+        model_bytes = f.read()
+    with open(paths["preprocessor"], "rb") as f:
+        preprocessor_bytes = f.read()
+    model_hash = hashlib.sha256(model_bytes).hexdigest()
+    preprocessor_hash = hashlib.sha256(preprocessor_bytes).hexdigest()
+    preprocessor = joblib.load(io.BytesIO(preprocessor_bytes))
+
+    state_dict = torch.load(io.BytesIO(model_bytes), map_location=device)
+    input_dim = state_dict["net.1.weight"].shape[1]
+    model = ViewPredictor(input_dim).to(device)
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    source = model_hash + preprocessor_hash
+    compiled = CompiledViewPredictor.load(parent_directory, source=source)
+
+    # tensors are counted exactly, the preprocessor by its pickled size
+    tensor_bytes = sum(t.numel() * t.element_size() for t in state_dict.values())
+    size_bytes = tensor_bytes + len(preprocessor_bytes)
+    if compiled is not None:
+        size_bytes += compiled.size_bytes
+
+    # the stored version only counts for the files it was computed from; models
+    # trained before versioning, or files newer than the metadata, get it computed here
+    version = metadata.get("model_version") if metadata.get("model_source") == source else None
+    if not version:
+        version = version_from_hashes(model_hash, preprocessor_hash,
+                                      os.path.join(parent_directory, f"{user_name}.csv"))
+    return ModelArtifacts(preprocessor, model, metadata, size_bytes, compiled, version)
+
+
+class ModelRegistry:
+    """
+    Per-process LRU of ModelArtifacts keyed by user directory.
+
+    An entry is reused while the mtime/size of its files are unchanged
+    (check_hash=True additionally compares file content hashes). Entries are
+    evicted least-recently-used first once max_bytes is exceeded.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024, check_hash=False):
+        self.max_bytes = max_bytes
+        self.check_hash = check_hash
+        self._entries = OrderedDict()   # key -> (fingerprint, ModelArtifacts)
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _fingerprint(self, parent_directory, user_name):
+        fingerprint = []
+        for name, path in artifact_paths(parent_directory, user_name).items():
+            if name == "compiled" and not os.path.exists(path):
+                # compiled artifact is optional
+                fingerprint.append(None)
+                continue
+            st = os.stat(path)
+            fingerprint.append((st.st_mtime_ns, st.st_size))
+            if self.check_hash:
+                fingerprint.append(ut.file_sha256(path))
+        return tuple(fingerprint)
+
+    def get(self, parent_directory, user_name):
+        key = (os.path.abspath(parent_directory), user_name)
+        fingerprint = self._fingerprint(parent_directory, user_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == fingerprint:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._drop(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        artifacts = load_artifacts(parent_directory, user_name)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (fingerprint, artifacts)
+            self.total_bytes += artifacts.size_bytes
+            # always keep the entry just loaded, even if it alone exceeds the cap
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return artifacts
+
+    def invalidate(self, parent_directory=None, user_name=None):
+        """Drop one user's entry, or everything when called without arguments."""
+        with self._lock:
+            if parent_directory is None:
+                for key in list(self._entries):
+                    self._drop(key)
+            else:
+                key = (os.path.abspath(parent_directory), user_name)
+                if key in self._entries:
+                    self._drop(key)
+
+    def _drop(self, key):
+        _, artifacts = self._entries.pop(key)
+        self.total_bytes -= artifacts.size_bytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# process-wide instance used by model_work
+registry = ModelRegistry()
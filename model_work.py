@@ -5,6 +5,8 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.utils.data import DataLoader, TensorDataset
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
@@ -13,43 +15,55 @@ import joblib
 import os
 import json
 import get_movie_summary as gms
+import embedding_store as es
+import compiled_model as cm
+import dataset_snapshot as ds
 from datetime import datetime
 from trend_score_compute import get_google_trend
+from trend_store import open_trend_store
+from prediction_store import open_prediction_store
+import forecast_pool
+from view_predictor import ViewPredictor
+from model_registry import registry, publish_artifacts
 import time
 
 # =========================
 # 1. Load Dataset
 # =========================
 
-def model_train(parent_directory,name_of_dataset):
-
-    data = pd.read_csv(os.path.join(parent_directory,name_of_dataset))
+def model_train(parent_directory,name_of_dataset,batch_size=None,epochs=14000,shuffle=True,val_interval=1,num_threads=None,warm_start=False,progress_callback=None):
+    """
+    Train the view predictor on User/<name>/<name>.csv and save model.pth,
+    preprocessor.pkl and <name>.json into parent_directory.
+
+    batch_size:   None keeps the original full-batch loop, an int switches to
+                  shuffled mini-batches through a DataLoader.
+    val_interval: run the (no-grad) validation pass every N epochs (1..epochs).
+    num_threads:  torch intra-op thread count, None leaves torch's default.
+    warm_start:   fine-tune the existing model.pth with the existing (not
+                  refitted) preprocessor.pkl instead of starting from scratch.
+    progress_callback: called after every validation pass as
+                  progress_callback(epoch, epochs, train_loss, val_loss).
+    """
+    if not 1 <= val_interval <= epochs:
+        raise ValueError(f"val_interval must be between 1 and epochs ({epochs}), got {val_interval}")
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    csv_path = os.path.join(parent_directory,name_of_dataset)
+    # the embedding text is skipped here and served by embedding_store instead
+    data = pd.read_csv(csv_path, usecols=lambda c: c != "embeddings")
     data["Video publish time"] = pd.to_datetime(data["Video publish time"])
     data["publish_day"] = data["Video publish time"].dt.day_name()
 
     #-----------------------------------------------------
-    # Parse the embedding column (it's a string like "[0.1 0.2  ...]")
-    #-----------------------------------------------------
-    def parse_embedding(x):
-        """
-        Convert a string like "[0.1 0.2 0.3]" into a list of floats.
-        If it is already a list, return it unchanged.
-        """
-        if isinstance(x, list):
-            return x
-        if isinstance(x, str):
-            x = x.strip()[1:-1]  # remove [ and ]
-            return [float(item) for item in x.split()]  # split by whitespace
-        return x
-
-    data["embeddings"] = data["embeddings"].apply(parse_embedding)
-
-    #-----------------------------------------------------
+    # Embedding matrix (parsed once, then memory-mapped from the .npy sidecar)
     # Expand embedding -> emb_0, emb_1, ...
     #-----------------------------------------------------
-    embedding_dim = len(data["embeddings"].iloc[0])
+    embedding_matrix, _ = es.load_embedding_matrix(csv_path)
+    embedding_dim = embedding_matrix.shape[1]
     embedding_cols = [f"emb_{i}" for i in range(embedding_dim)]
-    embedding_df   = pd.DataFrame(data["embeddings"].tolist(), columns=embedding_cols)
+    embedding_df   = pd.DataFrame(np.asarray(embedding_matrix), columns=embedding_cols, index=data.index)
     data = pd.concat([data, embedding_df], axis=1)
 
     # Keep only trend_score + weekday + embedding
@@ -71,7 +85,12 @@ def model_train(parent_directory,name_of_dataset):
         ]
     )
 
-    X_processed = preprocessor.fit_transform(X)
+    if warm_start:
+        # keep the feature space of the model being fine-tuned
+        preprocessor = joblib.load(os.path.join(parent_directory,"preprocessor.pkl"))
+        X_processed = preprocessor.transform(X)
+    else:
+        X_processed = preprocessor.fit_transform(X)
 
     input_dim = X_processed.shape[1]
     print("Input Dim:", input_dim)
@@ -79,26 +98,6 @@ def model_train(parent_directory,name_of_dataset):
     # =========================
     # 3. Model
     # =========================
-    class ViewPredictor(nn.Module):
-        def __init__(self, input_dim):
-            super().__init__()
-            self.net = nn.Sequential(
-                nn.Dropout(0.1),
-                nn.Linear(input_dim, 64),
-                nn.BatchNorm1d(64),
-                nn.ReLU(),
-                nn.Dropout(0.4),
-                nn.Linear(64, 32),
-                nn.BatchNorm1d(32),
-                nn.ReLU(),
-                nn.Dropout(0.4),
-
-                nn.Linear(32, 1)
-            )
-
-        def forward(self, x):
-            return self.net(x)
-
     # Train-validation split + tensor conversion
     X_train, X_val, y_train, y_val = train_test_split(X_processed, y, test_size=0.1, random_state=42)
     X_train = torch.tensor(X_train, dtype=torch.float32)
@@ -111,6 +110,8 @@ def model_train(parent_directory,name_of_dataset):
     # =========================
     device = "cpu"
     model = ViewPredictor(input_dim).to(device)
+    if warm_start:
+        model.load_state_dict(torch.load(os.path.join(parent_directory,'model.pth'), map_location=device))
 
 
     criterion = nn.SmoothL1Loss()
@@ -118,82 +119,180 @@ def model_train(parent_directory,name_of_dataset):
 
     best_val = float("inf")
     best_train=float('inf')
+    best_state = None   # published to model.pth only once training ends
     patience = 500
     pat_cnt  = 0
 
     # =========================
     # 5. Training loop
     # =========================
-    epochs = 14000
+    if batch_size is not None:
+        # BatchNorm cannot train on a single-row batch, drop it if the split leaves one
+        train_loader = DataLoader(
+            TensorDataset(X_train, y_train),
+            batch_size=batch_size,
+            shuffle=shuffle,
+            drop_last=len(X_train) % batch_size == 1
+        )
+
+    start_time = time.perf_counter()
+    samples_seen = 0
+    epochs_run = 0
     for epoch in range(epochs):
         model.train()
-        optimizer.zero_grad()
-        out = model(X_train.to(device))
-        loss = criterion(out, y_train.to(device))
-        loss.backward()
-        optimizer.step()
+        if batch_size is None:
+            optimizer.zero_grad()
+            out = model(X_train.to(device))
+            loss = criterion(out, y_train.to(device))
+            loss.backward()
+            optimizer.step()
+            epoch_loss = loss.item()
+            samples_seen += len(X_train)
+        else:
+            running_loss, running_count = 0.0, 0
+            for xb, yb in train_loader:
+                optimizer.zero_grad()
+                out = model(xb.to(device))
+                loss = criterion(out, yb.to(device))
+                loss.backward()
+                optimizer.step()
+                running_loss += loss.item() * len(xb)
+                running_count += len(xb)
+            epoch_loss = running_loss / max(1, running_count)
+            samples_seen += running_count
+        epochs_run = epoch + 1
+
+        if epoch_loss < best_train:
+            best_train=epoch_loss
+
+        if (epoch+1) % val_interval != 0:
+            continue
 
         model.eval()
-        val_out  = model(X_val.to(device))
-        val_loss = criterion(val_out, y_val.to(device)).item()
-
-        if (epoch+1) % 25 == 0:
-            print(f"Epoch {epoch+1}/{epochs} | Train: {loss.item():.4f} | Val: {val_loss:.4f}")
-            train_loss= loss.item()
-
-        if loss.item() < best_train:
-            best_train=loss.item()
+        with torch.no_grad():
+            val_out  = model(X_val.to(device))
+            val_loss = criterion(val_out, y_val.to(device)).item()
 
+        if (epoch+1) % 25 < val_interval:
+            print(f"Epoch {epoch+1}/{epochs} | Train: {epoch_loss:.4f} | Val: {val_loss:.4f}")
+        if progress_callback is not None:
+            progress_callback(epoch+1, epochs, epoch_loss, val_loss)
 
         if val_loss < best_val:
             best_val = val_loss
             pat_cnt = 0
-            torch.save(model.state_dict(), os.path.join(parent_directory,'model.pth'))
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
         else:
-            pat_cnt += 1
+            pat_cnt += val_interval
             if pat_cnt >= patience:
                 print(f"Early stopping at epoch {epoch+1}")
                 break
 
-    joblib.dump(preprocessor, os.path.join(parent_directory,"preprocessor.pkl"))
+    train_seconds = time.perf_counter() - start_time
+    samples_per_sec = samples_seen / max(train_seconds, 1e-9)
+    print(f"Training wall time: {train_seconds:.2f}s | {samples_per_sec:.0f} samples/sec | epochs: {epochs_run}")
+
+    if best_state is None:
+        # no validation pass improved on inf (e.g. NaN losses): keep the final weights
+        print(f"No improving validation pass (best val loss: {best_val}), saving the final weights")
+        best_state = model.state_dict()
     print(f'Best train loss :{best_train} best val loss: {best_val}')
     print("✅ Training complete (best model saved).")
     to_save_metadata={}
     to_save_metadata['best_train']=best_train
     to_save_metadata['best_val']=best_val
-    with open(f"{parent_directory}/{name_of_dataset.replace('.csv','.json')}", "w") as outfile:
-        json.dump(to_save_metadata, outfile, skipkeys=True)
+    to_save_metadata['train_seconds']=train_seconds
+    to_save_metadata['samples_per_sec']=samples_per_sec
+    to_save_metadata['epochs_run']=epochs_run
+    to_save_metadata['batch_size']=batch_size
+    to_save_metadata['training_mode']='warm_start' if warm_start else 'full'
+    # model.pth, preprocessor.pkl and the metadata (with model_version) appear together
+    to_save_metadata=publish_artifacts(parent_directory, os.path.join(parent_directory,name_of_dataset.replace('.csv','.json')),
+                                       best_state, preprocessor, to_save_metadata, csv_path)
+    cm.export_compiled(parent_directory)
+    return to_save_metadata
+
+
+def train_if_changed(parent_directory,name_of_dataset,max_append_ratio=0.2,finetune_epochs=1000,force_full=False,**train_kwargs):
+    """
+    model_train, but only as much as the dataset change needs, judged against
+    the snapshot of the last trained dataset (dataset_snapshot):
+
+    * byte-identical dataset, or the same rows re-saved, with artifacts in
+      place: no training, the existing metadata is returned,
+    * only appended rows (at most max_append_ratio of the previous size): warm-start
+      fine-tune of model.pth for finetune_epochs,
+    * anything else, or force_full: full training with train_kwargs.
+
+    The snapshot is written after every training run, so it always describes
+    the dataset the current model was trained on. The returned metadata has 'training_mode' ('skipped', 'warm_start' or 'full')
+    and 'time_saved_seconds', estimated against the last full training run.
+    """
+    csv_path = os.path.join(parent_directory,name_of_dataset)
+    metadata_path = os.path.join(parent_directory,name_of_dataset.replace('.csv','.json'))
+    have_artifacts = all(os.path.exists(p) for p in (os.path.join(parent_directory,'model.pth'),
+                                                     os.path.join(parent_directory,'preprocessor.pkl'),
+                                                     metadata_path))
+    mode, dataset_hash, rows, snapshot = ds.classify(parent_directory, csv_path, max_append_ratio)
+    full_seconds = (snapshot or {}).get('full_train_seconds') or 0.0
+
+    if mode == 'unchanged' and have_artifacts and not force_full:
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        metadata['training_mode'] = 'skipped'
+        metadata['time_saved_seconds'] = full_seconds
+        if snapshot['dataset_hash'] != dataset_hash:
+            # same rows in a re-saved file, the trained model still matches it
+            ds.rehash_snapshot(parent_directory, snapshot, dataset_hash)
+        print(f'Dataset unchanged ({dataset_hash[:16]}), keeping the trained model')
+        return metadata
+
+    if mode == 'append' and have_artifacts and not force_full:
+        print(f'{len(rows) - snapshot["n_rows"]} rows appended, fine-tuning the existing model')
+        train_kwargs = dict(train_kwargs, epochs=finetune_epochs)
+        metadata = model_train(parent_directory,name_of_dataset,warm_start=True,**train_kwargs)
+        metadata['full_train_seconds'] = full_seconds
+        metadata['time_saved_seconds'] = max(0.0, full_seconds - metadata['train_seconds'])
+    else:
+        metadata = model_train(parent_directory,name_of_dataset,**train_kwargs)
+        metadata['time_saved_seconds'] = 0.0
+    if rows is None:
+        # unchanged bytes, but the snapshot's row hashes are missing
+        rows = ds.row_hashes(csv_path)
+    ds.save_snapshot(parent_directory, dataset_hash, rows, metadata, metadata['training_mode'])
+    return metadata
+
+
+def predict_views_batch(artifacts, trend_scores, weekday_names, embeddings, device="cpu"):
+    """
+    Score many (trend_score, weekday, embedding) rows with a single
+    preprocessor.transform and a single forward pass, or through the folded
+    NumPy graph (compiled_model) when the registry loaded one.
+    embeddings: (n, dim) array-like. Returns views (in thousands) as a float array.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(trend_scores), -1)
+    if artifacts.compiled is not None:
+        weekday_index = [cm.WEEKDAYS.index(day) for day in weekday_names]
+        return artifacts.compiled.predict(trend_scores, weekday_index, embeddings)
+
+    df_input = pd.DataFrame(embeddings, columns=[f"emb_{i}" for i in range(embeddings.shape[1])])
+    df_input.insert(0, "publish_day", list(weekday_names))
+    df_input.insert(0, "trend_score", np.asarray(trend_scores, dtype=float))
+
+    X_in = artifacts.preprocessor.transform(df_input)
+    X_tensor = torch.tensor(X_in, dtype=torch.float32).to(device)
+    with torch.no_grad():
+        return artifacts.model(X_tensor).cpu().numpy().reshape(-1)
 
 
 def model_inference(movie_name,example_date,dataframe_ts,parent_directory,user_name):
     embedder = gms.embedder
-    with open(f"{parent_directory}/{user_name}.json", "r") as f:
-        to_save_metadata=json.load(f)
+    artifacts = registry.get(parent_directory, user_name)
+    to_save_metadata = artifacts.metadata
 
     best_train=to_save_metadata['best_train']
     best_val=to_save_metadata['best_val']
-    # --- Load the same model definition used in training ---
-    class ViewPredictor(nn.Module):
-        def __init__(self, input_dim):
-            super().__init__()
-            self.net = nn.Sequential(
-                nn.Dropout(0.1),
-                nn.Linear(input_dim, 64),
-                nn.BatchNorm1d(64),
-                nn.ReLU(),
-                nn.Dropout(0.4),
-                nn.Linear(64, 32),
-                nn.BatchNorm1d(32),
-                nn.ReLU(),
-                nn.Dropout(0.4),
-
-                nn.Linear(32, 1)
-            )
-
-        def forward(self, x):
-            return self.net(x)
 
-        
     device = "cpu"
     train_factor=1-(best_train/100)
     val_factor=1-(best_val/100)
@@ -207,33 +306,17 @@ def model_inference(movie_name,example_date,dataframe_ts,parent_directory,user_n
         Returns:
         views (in thousands) as a float
         """
-        # load the preprocessor
-        preprocessor = joblib.load(f"{parent_directory}/preprocessor.pkl")
-
-        # build the input dataframe
-        row = {
-            "trend_score": trend_score,
-            "publish_day": weekday_name
-        }
-        # add emb_0 ... emb_n
-        for idx, value in enumerate(embedding_vector):
-            row[f"emb_{idx}"] = value
-
-        df_input = pd.DataFrame([row])
-        X_in = preprocessor.transform(df_input)
-        X_tensor = torch.tensor(X_in, dtype=torch.float32).to(device)
-
-        # create the model with correct input-dim and load weights
-        input_dim = X_in.shape[1]
-        model = ViewPredictor(input_dim).to(device)
-        model.load_state_dict(torch.load(f"{parent_directory}/model.pth"))
-        model.eval()
+        # preprocessor and model come from the in-process registry
+        return float(predict_views_batch(artifacts, [trend_score], [weekday_name], [embedding_vector], device=device)[0])
 
-        with torch.no_grad():
-            pred_k = model(X_tensor).item()
-        return pred_k
+    train_data_df=pd.read_csv(f'{parent_directory}/{user_name}.csv',usecols=['Video title'])
 
-    train_data_df=pd.read_csv(f'{parent_directory}/{user_name}.csv')
+    if dataframe_ts is None:
+        # nothing uploaded this time, use the series stored for the title
+        dataframe_ts = open_trend_store(parent_directory).get(movie_name)
+        if dataframe_ts is None:
+            print(f'No trend data stored for {movie_name}, upload a Google Trends CSV first')
+            return None
 
     # -----------------------------------------------------------------------------
     # EXAMPLE USAGE
@@ -275,7 +358,146 @@ def model_inference(movie_name,example_date,dataframe_ts,parent_directory,user_n
 
         predicted = predict_views(trend_score, weekday, embedding)
         print(f"Predicted views for '{movie_name}' on {example_date}: min: {predicted*pred_factor:.2f}k max: {predicted:.2f}k")
-        return {'title':movie_name,'release date': example_date,'hype score': trend_score,'minimum_view': f'{predicted*pred_factor:.2f}k','avg_view':f'{predicted:.2f}k ','max':f'{predicted/pred_factor:.2f}k'}
+        return {'title':movie_name,'release date': example_date,'hype score': trend_score,'minimum_view': f'{predicted*pred_factor:.2f}k','avg_view':f'{predicted:.2f}k ','max':f'{predicted/pred_factor:.2f}k','model_version':artifacts.version}
     except Exception as e:
         print(f'Error occured as: {e}')
-        return None
\ No newline at end of file
+        return None
+
+def current_model_version(parent_directory, user_name):
+    """Version id of the user's trained model (the key of their cached predictions)."""
+    return registry.get(parent_directory, user_name).version
+
+
+def rescore_top_predictions(parent_directory, user_name, limit=20):
+    """
+    Re-run model_inference for the user's most requested (title, date) pairs
+    that have no prediction from the current model yet, with trend data from
+    the trend store, and cache the new results. Returns how many were stored.
+    """
+    artifacts = registry.get(parent_directory, user_name)
+    store = open_prediction_store(parent_directory, legacy_csv=f'{parent_directory}/{user_name}_cache.csv')
+    results = []
+    for title, upload_date, _ in store.top_requested(limit, exclude_version=artifacts.version):
+        result = model_inference(title, upload_date, None, parent_directory, user_name)
+        if result is not None:
+            results.append(result)
+    store.put_many(results)
+    print(f'Re-scored {len(results)} cached predictions for {user_name} with model {artifacts.version}')
+    return len(results)
+
+
+def month_dates(year, month):
+    """All dates of a month as 'YYYY-MM-DD' strings (calendar input)."""
+    start = pd.Timestamp(year=year, month=month, day=1)
+    return pd.date_range(start, start + pd.offsets.MonthEnd(0), freq='D').strftime('%Y-%m-%d').tolist()
+
+
+def predict_calendar(movie_names, dates, dataframes_ts, parent_directory, user_name, forecast_workers=0):
+    """
+    Upload-calendar predictions for every title in movie_names x every date in dates.
+
+    dataframes_ts maps title -> Google Trends DataFrame (same format as the one
+    uploaded on the Views Predictor page); titles missing from it use the user's
+    trend store. Each title is embedded once, its trend
+    scores for all dates come from one get_google_trend call, and all rows
+    go through a single forward pass. Titles that fail (no trend data, LLM or
+    embedding error) are skipped.
+
+    forecast_workers > 0 computes the trend scores of all titles up front in a
+    forecast_pool.ForecastPool of that many processes instead of one by one.
+
+    Returns one row per (title, date) with views in thousands, sorted by date
+    and then by predicted views.
+    """
+    embedder = gms.embedder
+    artifacts = registry.get(parent_directory, user_name)
+    train_factor=1-(artifacts.metadata['best_train']/100)
+    val_factor=1-(artifacts.metadata['best_val']/100)
+    trained_titles = set(pd.read_csv(f'{parent_directory}/{user_name}.csv',usecols=['Video title'])['Video title'])
+
+    dates = list(dates)
+    weekdays = [datetime.strptime(d, "%Y-%m-%d").strftime("%A") for d in dates]
+
+    dataframes_ts = dict(dataframes_ts or {})
+    stored = open_trend_store(parent_directory).get_many([t for t in movie_names if t not in dataframes_ts])
+    dataframes_ts.update(stored)
+
+    pooled_scores = {}
+    if forecast_workers:
+        pooled = forecast_pool.forecast_many({t: dataframes_ts[t] for t in movie_names if t in dataframes_ts},
+                                             dates, max_workers=forecast_workers)
+        for title, group in pooled[pooled['Status'] == 'ok'].groupby('Title', sort=False):
+            pooled_scores[title] = group['Hype_Score'].tolist()
+        for title, status in forecast_pool.ForecastPool.fit_times(pooled)['Status'].items():
+            if status != 'ok':
+                print(f'Trend forecast for {title} failed: {status}')
+
+    titles, embeddings, trend_rows = [], [], []
+    for movie_name in movie_names:
+        if movie_name not in dataframes_ts:
+            print(f'No trend data for {movie_name}, skipping')
+            continue
+        try:
+            embedding = gms.get_movie_summary_embedding(movie_name, embedder)
+            if isinstance(embedding, str):
+                raise ValueError('summary embedding failed')
+            if forecast_workers:
+                if movie_name not in pooled_scores:
+                    raise ValueError('trend forecast failed')
+                trend_scores = [int(t) for t in pooled_scores[movie_name]]
+            else:
+                trend_scores = [int(t) for t in get_google_trend(movie_name, dates, dataframes_ts[movie_name])]
+        except Exception as e:
+            print(f'Skipping {movie_name}: {e}')
+            continue
+        titles.append(movie_name)
+        embeddings.append(embedding)
+        trend_rows.append(trend_scores)
+
+    columns = ['Title','Upload_Date','Weekday','Hype_Score','Min','Avg','Max']
+    if not titles:
+        return pd.DataFrame(columns=columns)
+
+    n_dates = len(dates)
+    embedding_rows = np.repeat(np.asarray(embeddings, dtype=np.float32), n_dates, axis=0)
+    trend_flat = np.asarray(trend_rows, dtype=float).reshape(-1)
+    weekday_flat = weekdays * len(titles)
+
+    predicted = predict_views_batch(artifacts, trend_flat, weekday_flat, embedding_rows).astype(float)
+    pred_factor = np.repeat([train_factor if t in trained_titles else val_factor for t in titles], n_dates)
+
+    calendar = pd.DataFrame({
+        'Title': np.repeat(titles, n_dates),
+        'Upload_Date': dates * len(titles),
+        'Weekday': weekday_flat,
+        'Hype_Score': trend_flat.astype(int),
+        'Min': predicted * pred_factor,
+        'Avg': predicted,
+        'Max': predicted / pred_factor,
+    }, columns=columns)
+    return calendar.sort_values(['Upload_Date','Avg'], ascending=[True, False], ignore_index=True)
+
+
+def compare_training_modes(csv_path,batch_size=256,epochs=2000,num_threads=None):
+    """
+    Train the same CSV with the full-batch loop and the mini-batch loop (each in a
+    scratch copy of the folder so the real artifacts are untouched) and return
+    wall time, samples/sec and best losses side by side.
+    """
+    import shutil
+    import tempfile
+    name_of_dataset = os.path.basename(csv_path)
+    results = {}
+    for mode, bs in (("full_batch", None), ("mini_batch", batch_size)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shutil.copy(csv_path, os.path.join(tmp_dir, name_of_dataset))
+            results[mode] = model_train(tmp_dir, name_of_dataset, batch_size=bs, epochs=epochs, num_threads=num_threads)
+    return pd.DataFrame(results).T[["train_seconds","samples_per_sec","epochs_run","best_train","best_val"]]
+
+
+if __name__ == "__main__":
+    import sys
+    # python model_work.py User/<name>/<name>.csv [batch_size]
+    csv_path = sys.argv[1]
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    print(compare_training_modes(csv_path, batch_size=batch_size))
@@ -0,0 +1,220 @@
+import os
+import re
+import pickle
+import sqlite3
+import threading
+
+# Vocabulary used to recognise the genre line of a corpus text
+GENRES = {
+    "action", "adventure", "animation", "animated", "anime", "biography", "biographical", "comedy",
+    "crime", "documentary", "drama", "family", "fantasy", "film-noir", "noir", "history", "historical",
+    "horror", "music", "musical", "mystery", "romance", "romantic", "sci-fi", "science fiction",
+    "sport", "sports", "thriller", "war", "western", "superhero", "psychological", "heist", "spy",
+    "disaster", "coming-of-age", "satire", "parody", "teen", "martial arts", "slasher", "supernatural",
+    "dark comedy", "black comedy", "romantic comedy", "political", "legal", "epic", "period", "suspense",
+}
+GENRE_ALIASES = {"science fiction": "sci-fi", "scifi": "sci-fi", "sci fi": "sci-fi", "animated": "animation",
+                 "biographical": "biography", "sports": "sport", "romantic": "romance", "historical": "history"}
+YEAR_PATTERN = re.compile(r"\b(18[89]\d|19\d\d|20\d\d)\b")
+
+
+def _clean_line(line):
+    return line.strip().lstrip("-*•").strip()
+
+
+def _normalize_genre(genre):
+    genre = genre.strip().lower()
+    return GENRE_ALIASES.get(genre, genre)
+
+
+def parse_corpus_text(text):
+    """
+    Pull (title, year, genres, director) out of a free-text corpus entry.
+    Entries follow the ask_gemini_similarity layout: name, summary, genres,
+    actors, director, release year, production company, one per line, values
+    only; "Director: X" style lines are understood as well.
+    """
+    lines = [_clean_line(line) for line in text.split("\n") if _clean_line(line)]
+    title = lines[0] if lines else ""
+
+    year = None
+    for line in lines[1:]:
+        if YEAR_PATTERN.fullmatch(line):
+            year = int(line)
+            break
+    if year is None:
+        match = YEAR_PATTERN.search("\n".join(lines[1:]))
+        year = int(match.group(1)) if match else None
+
+    genres = []
+    for line in lines[1:]:
+        items = [_normalize_genre(g) for g in re.split(r"[,/|]", re.sub(r"(?i)^genres?\s*:", "", line)) if g.strip()]
+        if items and sum(1 for g in items if g in GENRES or g in GENRE_ALIASES.values()) * 2 >= len(items):
+            genres = list(dict.fromkeys(items))
+            break
+
+    director = None
+    for line in lines[1:]:
+        match = re.match(r"(?i)directors?\s*[:\-]\s*(.+)", line)
+        if match:
+            director = match.group(1).strip()
+            break
+    if director is None and len(lines) >= 6 and YEAR_PATTERN.fullmatch(lines[5]):
+        director = lines[4]
+
+    return {"title": title, "year": year, "genres": genres, "director": director}
+
+
+class MovieMetadataStore:
+    """
+    SQLite store for the similarity-search corpus. Row ids are the FAISS ids,
+    so store[faiss_id] returns the corpus text the way corpus_list[idx] used to.
+    Title, year, genres and director are parsed once on insert into their own
+    columns (genres in movie_genres), so lookups and filters never re-parse text.
+    Nothing is read until asked for; new texts are appended in one transaction.
+    """
+    def __init__(self, path="movies.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS movies (id INTEGER PRIMARY KEY, text TEXT NOT NULL)")
+        self._migrate()
+
+    def _migrate(self):
+        """Add the structured columns to older stores and backfill them from the text."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(movies)")}
+        with self._conn:
+            for name, sql_type in (("title", "TEXT"), ("year", "INTEGER"), ("genres", "TEXT"), ("director", "TEXT")):
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE movies ADD COLUMN {name} {sql_type}")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS movie_genres (genre TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (genre, id))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS movies_year ON movies (year)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS movies_director ON movies (director COLLATE NOCASE)")
+            rows = self._conn.execute("SELECT id, text FROM movies WHERE title IS NULL").fetchall()
+            self._write_parsed(rows)
+        if rows:
+            print(f"Parsed structured metadata for {len(rows)} entries in {self.path}")
+
+    def _write_parsed(self, rows):
+        """UPDATE the structured columns of (id, text) rows (inside a transaction)."""
+        parsed = [(movie_id, parse_corpus_text(text)) for movie_id, text in rows]
+        self._conn.executemany(
+            "UPDATE movies SET title=?, year=?, genres=?, director=? WHERE id=?",
+            [(p["title"], p["year"], ", ".join(p["genres"]), p["director"], movie_id) for movie_id, p in parsed],
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO movie_genres (genre, id) VALUES (?, ?)",
+            [(genre, movie_id) for movie_id, p in parsed for genre in p["genres"]],
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+    def __getitem__(self, movie_id):
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM movies WHERE id=?", (int(movie_id),)).fetchone()
+        if row is None:
+            raise KeyError(movie_id)
+        return row[0]
+
+    def _select_many(self, column, movie_ids):
+        movie_ids = [int(i) for i in movie_ids]
+        found = {}
+        with self._lock:
+            for start in range(0, len(movie_ids), 500):
+                chunk = movie_ids[start:start + 500]
+                found.update(self._conn.execute(
+                    f"SELECT id, {column} FROM movies WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return found
+
+    def get_many(self, movie_ids):
+        """{id: text} for the ids that exist."""
+        return self._select_many("text", movie_ids)
+
+    def titles_for(self, movie_ids):
+        """{id: title} for the ids that exist."""
+        return self._select_many("title", movie_ids)
+
+    def titles(self):
+        """All (id, title) rows in id order."""
+        with self._lock:
+            return self._conn.execute("SELECT id, title FROM movies ORDER BY id").fetchall()
+
+    def record(self, movie_id):
+        """Structured row for one id as a dict."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, year, genres, director, text FROM movies WHERE id=?", (int(movie_id),)
+            ).fetchone()
+        if row is None:
+            raise KeyError(movie_id)
+        return dict(zip(("id", "title", "year", "genres", "director", "text"), row))
+
+    def genres(self):
+        """Known genres with their title counts, most common first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT genre, COUNT(*) FROM movie_genres GROUP BY genre ORDER BY COUNT(*) DESC"
+            ).fetchall()
+
+    def filter_ids(self, genres=None, year_min=None, year_max=None, director=None):
+        """
+        Ids matching every given condition (any of `genres`, year range inclusive,
+        director substring, case-insensitive). Used to build FAISS ID selectors.
+        """
+        clauses, params = [], []
+        if genres:
+            genres = [genres] if isinstance(genres, str) else list(genres)
+            genres = [_normalize_genre(g) for g in genres]
+            clauses.append(f"id IN (SELECT id FROM movie_genres WHERE genre IN ({','.join('?' * len(genres))}))")
+            params += genres
+        if year_min is not None:
+            clauses.append("year >= ?")
+            params.append(int(year_min))
+        if year_max is not None:
+            clauses.append("year <= ?")
+            params.append(int(year_max))
+        if director:
+            clauses.append("director LIKE ?")
+            params.append(f"%{director}%")
+        where = " AND ".join(clauses) if clauses else "1"
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT id FROM movies WHERE {where}", params)]
+
+    def next_id(self):
+        with self._lock:
+            return (self._conn.execute("SELECT MAX(id) FROM movies").fetchone()[0] or -1) + 1
+
+    def append(self, texts, start_id=None):
+        """Insert texts with consecutive ids (from start_id or after the current max) and return the ids."""
+        with self._lock:
+            if start_id is None:
+                start_id = (self._conn.execute("SELECT MAX(id) FROM movies").fetchone()[0] or -1) + 1
+            ids = list(range(start_id, start_id + len(texts)))
+            with self._conn:
+                self._conn.executemany("INSERT INTO movies (id, text) VALUES (?, ?)", zip(ids, texts))
+                self._write_parsed(list(zip(ids, texts)))
+        return ids
+
+    def items(self):
+        """All (id, text) rows in id order."""
+        with self._lock:
+            return self._conn.execute("SELECT id, text FROM movies ORDER BY id").fetchall()
+
+
+def open_store(meta_file="movies.db", legacy_pickle="movies.pkl"):
+    """
+    Open the metadata store, importing the legacy pickled corpus list on first
+    use (list position i becomes id i, matching the old IndexFlatL2 order).
+    """
+    is_new = not os.path.exists(meta_file)
+    store = MovieMetadataStore(meta_file)
+    if is_new and legacy_pickle and os.path.exists(legacy_pickle):
+        with open(legacy_pickle, "rb") as f:
+            corpus_list = pickle.load(f)
+        store.append(corpus_list, start_id=0)
+        print(f"Imported {len(corpus_list)} entries from {legacy_pickle} into {meta_file}")
+    return store
@@ -0,0 +1,178 @@
+import os
+import time
+import sqlite3
+import threading
+
+import pandas as pd
+
+PREDICTION_DB = "predictions.db"
+# column layout of the old <name>_cache.csv, kept for exports
+COLUMNS = ['Title', 'Upload_Date', 'Hype_Score', 'Min', 'Avg', 'Max']
+# model_inference result keys, in COLUMNS order
+RESULT_KEYS = ['title', 'release date', 'hype score', 'minimum_view', 'avg_view', 'max']
+
+
+def title_key(title):
+    return " ".join(str(title).split()).lower()
+
+
+def _score(value):
+    """Hype score as a plain int/float for sqlite (numpy scalars would be stored as blobs)."""
+    if value is None or pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class PredictionStore:
+    """
+    Per-user prediction cache in User/<name>/predictions.db, one row per
+    (title, upload date, model version) with a unique index on (lowercased
+    title, date, version), so a cache check is a single indexed lookup instead
+    of scanning the history. Rows from an older model simply stop matching once
+    the model is retrained; hit_count records how often each was served.
+    WAL mode lets several sessions read while one writes; writes are batched
+    into one transaction and a repeated key replaces the older row.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "id INTEGER PRIMARY KEY, title_key TEXT NOT NULL, title TEXT NOT NULL, upload_date TEXT NOT NULL, "
+                "hype_score NUMERIC, min_view TEXT, avg_view TEXT, max_view TEXT, created REAL NOT NULL)"
+            )
+            self._migrate()
+
+    def _migrate(self):
+        """Add model_version / hit_count to stores created before versioning (inside a transaction)."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(predictions)")}
+        if "model_version" not in columns:
+            # '' is the version of rows whose model is unknown (legacy CSV imports)
+            self._conn.execute("ALTER TABLE predictions ADD COLUMN model_version TEXT NOT NULL DEFAULT ''")
+        if "hit_count" not in columns:
+            self._conn.execute("ALTER TABLE predictions ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("DROP INDEX IF EXISTS predictions_key")
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS predictions_version_key ON predictions (title_key, upload_date, model_version)"
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    @staticmethod
+    def _result(row):
+        return dict(zip(RESULT_KEYS + ['model_version'], row))
+
+    def lookup(self, title, upload_date, model_version=""):
+        """
+        The cached model_inference-style result dict produced by model_version,
+        or None. A hit increments the row's hit_count.
+        """
+        key = (title_key(title), str(upload_date), model_version or "")
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, title, upload_date, hype_score, min_view, avg_view, max_view, model_version FROM predictions "
+                "WHERE title_key=? AND upload_date=? AND model_version=?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE predictions SET hit_count=hit_count+1 WHERE id=?", (row[0],))
+        return self._result(row[1:])
+
+    def put_many(self, results):
+        """
+        Store model_inference-style result dicts in one transaction. A result's
+        'model_version' (if any) is part of its key; 'hit_count' seeds the counter.
+        """
+        now = time.time()
+        rows = [(title_key(r['title']), str(r['title']).strip(), str(r['release date']), _score(r['hype score']),
+                 r['minimum_view'], r['avg_view'], r['max'], now, r.get('model_version') or "",
+                 int(r.get('hit_count', 0))) for r in results]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO predictions (title_key, title, upload_date, hype_score, min_view, avg_view, max_view, created, "
+                "model_version, hit_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(title_key, upload_date, model_version) DO UPDATE SET title=excluded.title, "
+                "hype_score=excluded.hype_score, min_view=excluded.min_view, avg_view=excluded.avg_view, "
+                "max_view=excluded.max_view, created=excluded.created",
+                rows,
+            )
+        return len(rows)
+
+    def put(self, result):
+        return self.put_many([result])
+
+    def top_requested(self, limit=20, exclude_version=None):
+        """
+        The most served (title, upload_date) pairs, hits summed over all model
+        versions, as [(title, upload_date, hits)]. exclude_version skips pairs
+        that already have a row for that version.
+        """
+        query = ("SELECT p.title_key, p.upload_date, MAX(p.title), SUM(p.hit_count) AS hits FROM predictions p "
+                 "GROUP BY p.title_key, p.upload_date ")
+        params = []
+        if exclude_version is not None:
+            query += ("HAVING NOT EXISTS (SELECT 1 FROM predictions q WHERE q.title_key=p.title_key "
+                      "AND q.upload_date=p.upload_date AND q.model_version=?) ")
+            params.append(exclude_version)
+        query += "ORDER BY hits DESC, MAX(p.created) DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(title, upload_date, hits) for _, upload_date, title, hits in rows]
+
+    def history(self):
+        """
+        The newest prediction of every (title, upload date), oldest first, with
+        the old CSV columns.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, upload_date, hype_score, min_view, avg_view, max_view FROM predictions p "
+                "WHERE id = (SELECT q.id FROM predictions q WHERE q.title_key=p.title_key AND q.upload_date=p.upload_date "
+                "ORDER BY q.created DESC, q.id DESC LIMIT 1) ORDER BY created, id"
+            ).fetchall()
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+    def export_csv(self, path):
+        """Write the history in the <name>_cache.csv format (used by metric_eval and downloads)."""
+        data = self.history()
+        tmp = path + ".tmp"
+        data.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        return path
+
+    def import_csv(self, path):
+        """Load rows of an old <name>_cache.csv; later rows win for repeated (title, date)."""
+        data = pd.read_csv(path)
+        if data.empty:
+            return 0
+        data = data.reindex(columns=COLUMNS)
+        return self.put_many([dict(zip(RESULT_KEYS, row)) for row in data.itertuples(index=False)])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_prediction_store(parent_directory, legacy_csv=None):
+    """
+    The PredictionStore of a user folder, one instance per process. A new store
+    is seeded from legacy_csv (the old <name>_cache.csv) when that file exists.
+    """
+    path = os.path.abspath(os.path.join(parent_directory, PREDICTION_DB))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            os.makedirs(parent_directory, exist_ok=True)
+            is_new = not os.path.exists(path)
+            store = _stores[path] = PredictionStore(path)
+            if is_new and legacy_csv and os.path.exists(legacy_csv):
+                print(f"Imported {store.import_csv(legacy_csv)} cached predictions from {legacy_csv}")
+        return store
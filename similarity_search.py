@@ -1,24 +1,143 @@
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 import pickle
 import os
+import time
+import re
+import difflib
+import threading
+import unicodedata
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import chatbot_engine as cbe
+import movie_store
+import lexical_search as ls
+import embedder_service
 
-# Load the embedder once
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# Shared with get_movie_summary, loads on first use
+embedder = embedder_service.get_embedder("all-MiniLM-L6-v2")
 
 def get_embedding(text):
     emb = embedder.encode(text, convert_to_numpy=True, normalize_embeddings=True)
     return emb.astype("float32")
 
-def manage_faiss_index(corpus_list=None, flag="save", index_file="movies.index", meta_file="movies.pkl"):
+def get_embeddings(texts):
+    """Batch version of get_embedding -> (n, dim) float32."""
+    emb = embedder.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(emb, dtype="float32")
+
+def write_index_atomic(index, index_file):
+    """Write to a temp file and rename, so readers never see a partial index."""
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    faiss.write_index(index, tmp_file)
+    os.replace(tmp_file, index_file)
+
+def read_index(index_file):
+    """
+    Read the FAISS index; a legacy plain IndexFlatL2 (positions = ids) is
+    converted once to an IndexIDMap2 and written back.
+    """
+    index = faiss.read_index(index_file)
+    if not isinstance(index, faiss.IndexIDMap2):
+        print(f"Converting {index_file} to an ID-mapped index (one-time)")
+        vectors = index.reconstruct_n(0, index.ntotal)
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+        index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+        write_index_atomic(index, index_file)
+    return index
+
+# Index types for the catalogue. "auto" picks one from the corpus size (choose_index_type).
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+
+def choose_index_type(n_vectors):
+    """Exact search while it is cheap, HNSW up to ~1M titles, compressed IVF-PQ beyond."""
+    if n_vectors < 50_000:
+        return "flat"
+    if n_vectors < 1_000_000:
+        return "hnsw"
+    return "ivf_pq"
+
+def _ivf_nlist(n_vectors):
+    # ~4*sqrt(n) lists, but keep >= 39 training points per centroid
+    return max(1, min(4 * int(np.sqrt(n_vectors)), n_vectors // 39))
+
+def _pq_m(dim):
+    # largest sub-quantizer count <= 48 that divides dim (384 -> 48 x 8 dims)
+    return max(m for m in range(1, 49) if dim % m == 0)
+
+def build_index(vectors, ids, index_type="auto"):
+    """
+    Build an IndexIDMap2 of the requested type over vectors/ids.
+    IVF types are trained on the vectors; corpora too small to train fall back to flat.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n_vectors, dim = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type must be 'auto' or one of {INDEX_TYPES}")
+    if index_type == "ivf_pq" and n_vectors < 39 * 256:
+        # 8-bit PQ codebooks need ~39 points per code
+        print(f"{n_vectors} vectors are too few to train ivf_pq, using ivf_flat")
+        index_type = "ivf_flat"
+    if index_type.startswith("ivf") and n_vectors < 256:
+        print(f"{n_vectors} vectors are too few to train {index_type}, using flat")
+        index_type = "flat"
+
+    if index_type == "flat":
+        base = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, HNSW_M)
+        base.hnsw.efConstruction = 80
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        nlist = _ivf_nlist(n_vectors)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), 8)
+        base.train(vectors)
+        base.nprobe = min(IVF_NPROBE, nlist)
+
+    index = faiss.IndexIDMap2(base)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index
+
+def index_type_of(index):
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return "flat"
+
+def extract_vectors(index):
+    """(ids, vectors) stored in an IndexIDMap2; lossy for ivf_pq."""
+    ids = faiss.vector_to_array(index.id_map).astype("int64")
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexIVF):
+        base.make_direct_map()
+    return ids, base.reconstruct_n(0, base.ntotal)
+
+def manage_faiss_index(corpus_list=None, flag="save", index_file="movies.index", meta_file="movies.db", index_type="auto"):
     """
-    Manage FAISS index: save, load, or append
+    Manage FAISS index: save (append), or load
     corpus_list: list of text corpus (required if flag='save')
     flag: 'save' or 'load'
-    index_file: FAISS index file
-    meta_file: metadata pickle file
+    index_file: FAISS index file (IndexIDMap2, ids = metadata row ids)
+    meta_file: SQLite metadata store (movie_store.MovieMetadataStore),
+               a legacy movies.pkl next to it is imported on first use
+    index_type: used when the index is first created ('auto' or one of INDEX_TYPES).
+                With 'auto', an index whose type was auto-chosen is rebuilt when
+                an append moves it into another choose_index_type tier; an
+                explicitly chosen type is kept (see rebuild_index)
+    Returns (index, store), store[id] is the corpus text of FAISS id `id`.
     """
 
     if flag == "save":
@@ -26,64 +145,562 @@ def manage_faiss_index(corpus_list=None, flag="save", index_file="movies.index",
             raise ValueError("corpus_list must be provided when saving index.")
 
         # Generate embeddings
-        embeddings = np.array([get_embedding(c) for c in corpus_list]).astype("float32")
-        dim = embeddings.shape[1]
+        embeddings = get_embeddings(corpus_list)
 
-        if os.path.exists(index_file) and os.path.exists(meta_file):
-            # Load existing index and metadata
-            index = faiss.read_index(index_file)
-            with open(meta_file, "rb") as f:
-                old_corpus = pickle.load(f)
-
-            # Prepend new embeddings and metadata
-            combined_embeddings = np.vstack((embeddings, index.reconstruct_n(0, index.ntotal)))
-            index = faiss.IndexFlatL2(dim)
-            index.add(combined_embeddings)
-
-            combined_corpus = corpus_list + old_corpus
-
-            # Save combined metadata
-            with open(meta_file, "wb") as f:
-                pickle.dump(combined_corpus, f)
+        store = movie_store.open_store(meta_file)
+        # metadata first: ids written without vectors are harmless, the reverse is not
+        ids = store.append(corpus_list)
+        if os.path.exists(index_file):
+            # Append to the existing index, stored vectors are never copied out
+            index = read_index(index_file)
+            before = index.ntotal
+            index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+            current = index_type_of(index)
+            # only follow the size tiers while the index still has the type 'auto' gave it
+            if (index_type == "auto" and current == choose_index_type(before)
+                    and choose_index_type(index.ntotal) != current):
+                print(f"{index.ntotal} vectors: rebuilding {index_file} from {current} "
+                      f"as {choose_index_type(index.ntotal)}")
+                all_ids, vectors = extract_vectors(index)
+                index = build_index(vectors, all_ids, "auto")
         else:
             # No existing index: create new
-            index = faiss.IndexFlatL2(dim)
-            index.add(embeddings)
-
-            with open(meta_file, "wb") as f:
-                pickle.dump(corpus_list, f)
+            index = build_index(embeddings, ids, index_type)
 
         # Save FAISS index
-        faiss.write_index(index, index_file)
-        return index, combined_corpus if 'combined_corpus' in locals() else corpus_list
+        write_index_atomic(index, index_file)
+        return index, store
 
     elif flag == "load":
-        if not os.path.exists(index_file) or not os.path.exists(meta_file):
+        if not os.path.exists(index_file):
             raise FileNotFoundError("No saved FAISS index/metadata found. Run with flag='save' first.")
 
-        # Load FAISS index
-        index = faiss.read_index(index_file)
-
-        # Load metadata
-        with open(meta_file, "rb") as f:
-            corpus_list = pickle.load(f)
-
-        return index, corpus_list
+        # Load FAISS index and metadata
+        store = movie_store.open_store(meta_file)
+        index = read_index(index_file)
+        return index, store
 
     else:
         raise ValueError("flag must be 'save' or 'load'")
 
-def recommend(query, top_n=2):
-    index,corpus_list=manage_faiss_index(flag="load")
-    query_text=cbe.ask_gemini_similarity(query)
-    query_emb = get_embedding(query_text).reshape(1, -1)
-    distances, indices = index.search(query_emb, top_n)
+def rebuild_index(index_type="auto", index_file="movies.index"):
+    """Rebuild the catalogue index as another type from its stored vectors."""
+    index = read_index(index_file)
+    if index_type_of(index) == "ivf_pq":
+        print("Rebuilding from an ivf_pq index: stored vectors are PQ approximations")
+    ids, vectors = extract_vectors(index)
+    index = build_index(vectors, ids, index_type)
+    write_index_atomic(index, index_file)
+    print(f"Rebuilt {index_file} as {index_type_of(index)} with {index.ntotal} vectors")
+    return index
+
+def synthetic_vectors(n_vectors, dim=384, n_clusters=200, seed=0):
+    """Clustered, L2-normalised vectors (closer to sentence embeddings than pure noise)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, n_clusters, n_vectors)] + 0.6 * rng.normal(size=(n_vectors, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def benchmark_index_types(vectors=None, n_vectors=100_000, n_queries=200, k=10, index_types=INDEX_TYPES):
+    """
+    Build each index type over the same vectors (the catalogue's, or synthetic)
+    and report build time, recall@k against exact flat search, per-query
+    latency and serialized index size.
+    """
+    import time
+    if vectors is None:
+        vectors = synthetic_vectors(n_vectors)
+    ids = np.arange(len(vectors), dtype="int64")
+    rng = np.random.default_rng(1)
+    n_queries = min(n_queries, len(vectors))
+    queries = vectors[rng.choice(len(vectors), n_queries, replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype("float32")
+
+    exact = build_index(vectors, ids, "flat")
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_index(vectors, ids, index_type)
+        build_s = time.perf_counter() - start
+
+        latencies = []
+        found = np.empty_like(truth)
+        for q in range(n_queries):
+            start = time.perf_counter()
+            _, found[q:q + 1] = index.search(queries[q:q + 1], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        recall = np.mean([len(set(found[q]) & set(truth[q])) / k for q in range(n_queries)])
+        results.append({
+            "index_type": index_type,
+            "vectors": len(vectors),
+            "build_s": round(build_s, 3),
+            f"recall@{k}": round(float(recall), 4),
+            "query_ms_p50": round(float(np.percentile(latencies, 50)), 4),
+            "query_ms_p95": round(float(np.percentile(latencies, 95)), 4),
+            "index_mb": round(faiss.serialize_index(index).nbytes / 1e6, 2),
+        })
+    return results
+
+def benchmark_append(sizes=(1000, 10000, 100000), n_new=10, dim=384):
+    """
+    Cost of adding n_new vectors to a corpus of each size: the old
+    reconstruct + rebuild + re-pickle path vs. the ID-mapped append.
+    """
+    import tempfile
+    import time
+    rng = np.random.default_rng(0)
     results = []
-    for idx, dist in zip(indices[0], distances[0]):
-        title = corpus_list[idx].split("\n")[0]  # first line = movie title
-        results.append((title, dist))
+    for size in sizes:
+        vectors = rng.normal(size=(size, dim)).astype("float32")
+        new_vectors = rng.normal(size=(n_new, dim)).astype("float32")
+        corpus = [f"Movie {i}\nsome description" for i in range(size)]
+        new_corpus = [f"New movie {i}\nsome description" for i in range(n_new)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old_index, old_meta = os.path.join(tmp_dir, "old.index"), os.path.join(tmp_dir, "old.pkl")
+            flat = faiss.IndexFlatL2(dim)
+            flat.add(vectors)
+            faiss.write_index(flat, old_index)
+            with open(old_meta, "wb") as f:
+                pickle.dump(corpus, f)
+
+            start = time.perf_counter()
+            index = faiss.read_index(old_index)
+            with open(old_meta, "rb") as f:
+                old_corpus = pickle.load(f)
+            combined = np.vstack((new_vectors, index.reconstruct_n(0, index.ntotal)))
+            index = faiss.IndexFlatL2(dim)
+            index.add(combined)
+            with open(old_meta, "wb") as f:
+                pickle.dump(new_corpus + old_corpus, f)
+            faiss.write_index(index, old_index)
+            rebuild_s = time.perf_counter() - start
+
+            new_index, new_meta = os.path.join(tmp_dir, "new.index"), os.path.join(tmp_dir, "new.db")
+            idmap = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+            idmap.add_with_ids(vectors, np.arange(size, dtype="int64"))
+            faiss.write_index(idmap, new_index)
+            movie_store.MovieMetadataStore(new_meta).append(corpus)
+
+            start = time.perf_counter()
+            index = faiss.read_index(new_index)
+            read_s = time.perf_counter() - start
+            ids = movie_store.MovieMetadataStore(new_meta).append(new_corpus)
+            index.add_with_ids(new_vectors, np.asarray(ids, dtype="int64"))
+            add_s = time.perf_counter() - start - read_s
+            write_index_atomic(index, new_index)
+            append_s = time.perf_counter() - start
+        # add_s is the append itself; the rest is reading/writing the index file
+        results.append({"corpus_size": size, "rebuild_s": rebuild_s, "append_s": append_s,
+                        "append_add_only_s": add_s})
+    return results
+
+def normalize_title(title):
+    """Lower-case, accent/punctuation-free form of a title for lookups."""
+    title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii").lower()
+    title = re.sub(r"\((19|20)\d{2}\)", " ", title)     # "Heat (1995)" -> "heat"
+    title = re.sub(r"[^a-z0-9]+", " ", title)
+    return " ".join(title.split())
+
+class TitleLookup:
+    """
+    Title -> FAISS id index over the catalogue titles (store.titles()).
+    Exact matches on the normalized title first, then difflib fuzzy matching
+    among titles sharing the query's first character.
+    """
+    def __init__(self, items, fuzzy_cutoff=0.85):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._ids = {}
+        self._buckets = {}
+        for movie_id, title in items:
+            key = normalize_title(title or "")
+            if key and key not in self._ids:
+                self._ids[key] = movie_id
+                self._buckets.setdefault(key[0], []).append(key)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def find(self, query):
+        """FAISS id of the catalogue entry matching query, or None."""
+        key = normalize_title(query)
+        movie_id = self._ids.get(key)
+        kind = "exact" if movie_id is not None else None
+        if movie_id is None and key:
+            close = difflib.get_close_matches(key, self._buckets.get(key[0], []), n=1, cutoff=self.fuzzy_cutoff)
+            # numbers must agree exactly, "toy story 2" is not a typo of "toy story 3"
+            if close and re.findall(r"\d+", close[0]) == re.findall(r"\d+", key):
+                movie_id, kind = self._ids[close[0]], "fuzzy"
+        with self._lock:
+            if kind == "exact":
+                self.exact_hits += 1
+            elif kind == "fuzzy":
+                self.fuzzy_hits += 1
+            else:
+                self.misses += 1
+        return movie_id
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.fuzzy_hits + self.misses
+            return {
+                "titles": len(self._ids),
+                "exact_hits": self.exact_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "llm_calls_avoided_rate": (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+            }
+
+def stored_vector(index, movie_id):
+    """Vector already in the index for movie_id (None if the index type cannot return it)."""
+    try:
+        base = faiss.downcast_index(index.index)
+        if isinstance(base, faiss.IndexIVF) and not base.direct_map.type:
+            base.make_direct_map()
+        return index.reconstruct(int(movie_id)).reshape(1, -1)
+    except RuntimeError as e:
+        print(f"Could not reuse stored vector for id {movie_id}: {e}")
+        return None
+
+class IndexCache:
+    """
+    Process-wide (index, store) for recommend(): loaded once, reloaded when
+    the index file changes on disk (mtime/size). With use_mmap=True the index
+    is mapped from the file (IO_FLAG_MMAP_IFC, or IO_FLAG_MMAP for IVF) so
+    several worker processes share the page cache instead of each holding a
+    private copy.
+    """
+    def __init__(self, index_file="movies.index", meta_file="movies.db", use_mmap=False, window=1000):
+        self.index_file = index_file
+        self.meta_file = meta_file
+        self.use_mmap = use_mmap
+        self._lock = threading.Lock()
+        self._index = None
+        self._store = None
+        self._signature = None
+        self.version = 0   # bumped on every (re)load
+        self.loads = 0
+        self.last_load_seconds = None
+        self.total_load_seconds = 0.0
+        self._search_ms = deque(maxlen=window)
+        self._query_ms = deque(maxlen=window)
+        self._titles = None
+        self._titles_version = None
+        self._bm25 = None
+        self._bm25_version = None
+        self._bm25_build_lock = threading.Lock()   # one BM25 build at a time, outside _lock
+
+    def _current_signature(self):
+        if not os.path.exists(self.index_file):
+            raise FileNotFoundError("No saved FAISS index/metadata found. Run with flag='save' first.")
+        st = os.stat(self.index_file)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        if self.use_mmap:
+            try:
+                return self._read_mmap()
+            except RuntimeError as e:
+                print(f"mmap read not supported for {self.index_file} ({e}), reading into memory")
+        return read_index(self.index_file)
+
+    def _read_mmap(self):
+        """
+        Flat/HNSW codes are only shared through IO_FLAG_MMAP_IFC (in-place
+        mapping of the whole file); IO_FLAG_MMAP only maps IVF inverted lists,
+        so IVF indexes (and FAISS builds without MMAP_IFC) use that instead.
+        """
+        read_only = faiss.IO_FLAG_READ_ONLY
+        if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            index = faiss.read_index(self.index_file, faiss.IO_FLAG_MMAP_IFC | read_only)
+            if not isinstance(index, faiss.IndexIDMap2):
+                raise RuntimeError(f"expected IndexIDMap2, got {type(index).__name__}")
+            if faiss.try_extract_index_ivf(index.index) is None:
+                return index
+        index = faiss.read_index(self.index_file, faiss.IO_FLAG_MMAP | read_only)
+        if not isinstance(index, faiss.IndexIDMap2):
+            raise RuntimeError(f"expected IndexIDMap2, got {type(index).__name__}")
+        return index
+
+    def get(self):
+        index, store, _ = self.get_versioned()
+        return index, store
+
+    def get_versioned(self):
+        """(index, store, version) read atomically, for callers that cache per version."""
+        signature = self._current_signature()
+        with self._lock:
+            if self._index is None or signature != self._signature:
+                start = time.perf_counter()
+                index = self._read()
+                store = self._store if self._store is not None else movie_store.open_store(self.meta_file)
+                # re-stat after reading: a legacy conversion rewrites the file
+                self._index, self._store, self._signature = index, store, self._current_signature()
+                self.last_load_seconds = time.perf_counter() - start
+                self.total_load_seconds += self.last_load_seconds
+                self.loads += 1
+                self.version += 1
+            return self._index, self._store, self.version
+
+    def title_lookup(self):
+        """TitleLookup for the currently loaded catalogue, rebuilt after a reload."""
+        _, store = self.get()
+        with self._lock:
+            if self._titles is None or self._titles_version != self.version:
+                version = self.version
+                self._titles = TitleLookup(store.titles())
+                self._titles_version = version
+            return self._titles
+
+    def lexical_index(self):
+        """
+        BM25Index over the currently loaded corpus texts, rebuilt after a
+        reload. The build runs outside _lock so vector queries are not held up.
+        """
+        _, store, version = self.get_versioned()
+        with self._lock:
+            if self._bm25 is not None and self._bm25_version == version:
+                return self._bm25
+        with self._bm25_build_lock:
+            with self._lock:
+                # another query may have built it while we waited
+                if self._bm25 is not None and self._bm25_version == version:
+                    return self._bm25
+            bm25 = ls.BM25Index.from_items(store.items())
+            with self._lock:
+                # a reload during the build keeps the newer version's slot free
+                if self.version == version:
+                    self._bm25 = bm25
+                    self._bm25_version = version
+        return bm25
+
+    def record_query(self, search_seconds, total_seconds):
+        with self._lock:
+            self._search_ms.append(search_seconds * 1000)
+            self._query_ms.append(total_seconds * 1000)
+
+    def stats(self):
+        with self._lock:
+            search_ms = np.array(self._search_ms) if self._search_ms else np.zeros(1)
+            query_ms = np.array(self._query_ms) if self._query_ms else np.zeros(1)
+            return {
+                "version": self.version,
+                "ntotal": self._index.ntotal if self._index is not None else 0,
+                "mmap": self.use_mmap,
+                "loads": self.loads,
+                "last_load_seconds": self.last_load_seconds,
+                "total_load_seconds": self.total_load_seconds,
+                "queries": len(self._query_ms),
+                "search_ms_p50": float(np.percentile(search_ms, 50)),
+                "search_ms_p95": float(np.percentile(search_ms, 95)),
+                "query_ms_p50": float(np.percentile(query_ms, 50)),
+                "query_ms_p95": float(np.percentile(query_ms, 95)),
+            }
+
+
+# shared by every Streamlit session in this process; FAISS_MMAP=1 enables memory-mapped IO
+index_cache = IndexCache(use_mmap=os.environ.get("FAISS_MMAP", "0") == "1")
+
+class ResultCache:
+    """LRU of recommendation results keyed by (normalized query, top_n, index version)."""
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(self._entries[key])
+            self.misses += 1
+            return None
+
+    def put(self, key, results):
+        with self._lock:
+            version = key[2]
+            if version != self._version:
+                # the index was rebuilt/appended: everything cached is stale
+                self._entries.clear()
+                self._version = version
+            self._entries[key] = tuple(results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "index_version": self._version,
+                    "hits": self.hits, "misses": self.misses}
+
+
+result_cache = ResultCache()
+
+def search_params(index, ids):
+    """
+    SearchParameters restricting a search to `ids` with a FAISS ID selector
+    (IndexIDMap2 translates it to internal ids), typed for the base index.
+    """
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# how deep each ranking goes before lexical/hybrid fusion
+FUSION_DEPTH = 50
+
+def _query_vectors(index, queries, use_llm=True):
+    """
+    One query vector per query: stored vector for catalogue titles, otherwise
+    the embedding of the LLM expansion (use_llm) or of the raw query text.
+    Returns (matrix, fallback_rows): rows whose expansion failed are embedded
+    from the raw query instead and listed in fallback_rows.
+    """
+    lookup = index_cache.title_lookup()
+    vectors = [None] * len(queries)
+    for i, query in enumerate(queries):
+        movie_id = lookup.find(query)
+        if movie_id is not None:
+            vectors[i] = stored_vector(index, movie_id)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    fallback_rows = set()
+    if missing:
+        texts = [queries[i] for i in missing]
+        if use_llm:
+            with ThreadPoolExecutor(max_workers=min(8, len(missing))) as pool:
+                expansions = list(pool.map(cbe.ask_gemini_similarity, texts))
+            for j, (i, expansion) in enumerate(zip(missing, expansions)):
+                if cbe.is_failed_reply(expansion):
+                    # never embed the error text itself
+                    print(f"LLM expansion failed for {queries[i]!r} ({expansion}), searching the raw query")
+                    fallback_rows.add(i)
+                else:
+                    texts[j] = expansion
+        for i, emb in zip(missing, get_embeddings(texts)):
+            vectors[i] = emb.reshape(1, -1)
+    return np.vstack(vectors), fallback_rows
+
+def recommend_many(queries, top_n=2, filters=None, mode="vector"):
+    """
+    recommend() for many queries at once: cached results are returned as is,
+    the remaining queries get their vectors from the title lookup or from one
+    batched encode of the LLM expansions, and all of them go through a single
+    index.search. Returns one [(title, distance), ...] list per query.
+
+    filters: optional dict for movie_store filter_ids (genres, year_min,
+    year_max, director), e.g. {"genres": ["sci-fi"], "year_min": 2010}; the
+    search itself is restricted to matching ids instead of post-filtering.
+
+    mode: "vector" (default, LLM expansion for unknown titles), "lexical"
+    (BM25 over the corpus text) or "hybrid" (BM25 fused with a vector search
+    of the raw query via reciprocal rank fusion). lexical and hybrid never
+    call the LLM; their "distance" is 1/s - 1 for a fused score s in (0, 1],
+    so the page's 1/(1+distance) similarity shows s.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {SEARCH_MODES}")
+    start = time.perf_counter()
+    index, corpus_list, version = index_cache.get_versioned()
+    results = [None] * len(queries)
+    filters_key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in (filters or {}).items()))
+
+    # identical (normalized) queries are resolved once
+    pending = OrderedDict()
+    for pos, query in enumerate(queries):
+        key = (normalize_title(query), top_n, version, filters_key, mode)
+        cached = result_cache.get(key)
+        if cached is not None:
+            results[pos] = cached
+        else:
+            pending.setdefault(key, []).append(pos)
+    if not pending:
+        return results
+
+    params = None
+    allowed = None
+    if filters:
+        allowed = corpus_list.filter_ids(**filters)
+        if not allowed:
+            for key, positions in pending.items():
+                result_cache.put(key, [])
+                for pos in positions:
+                    results[pos] = []
+            return results
+        params = search_params(index, allowed)
+
+    keys = list(pending)
+    pending_queries = [queries[pending[key][0]] for key in keys]
+    depth = top_n if mode == "vector" else max(top_n, FUSION_DEPTH)
+
+    search_seconds = 0.0
+    fallback_rows = set()
+    if mode in ("vector", "hybrid"):
+        query_matrix, fallback_rows = _query_vectors(index, pending_queries, use_llm=(mode == "vector"))
+        search_start = time.perf_counter()
+        distances, indices = index.search(query_matrix, depth, params=params)
+        search_seconds += time.perf_counter() - search_start
+    if mode in ("lexical", "hybrid"):
+        bm25 = index_cache.lexical_index()
+        search_start = time.perf_counter()
+        lexical = [bm25.search(query, k=depth, allowed_ids=allowed) for query in pending_queries]
+        search_seconds += time.perf_counter() - search_start
+
+    ranked = []
+    for row in range(len(keys)):
+        if mode == "vector":
+            ranked.append([(int(idx), dist) for idx, dist in zip(indices[row], distances[row]) if idx >= 0])
+            continue
+        rankings = [[doc_id for doc_id, _ in lexical[row]]]
+        if mode == "hybrid":
+            rankings.append([int(idx) for idx in indices[row] if idx >= 0])
+        fused, best = ls.reciprocal_rank_fusion(rankings)
+        ranked.append([(doc_id, np.float32(best / score - 1)) for doc_id, score in fused[:top_n]])
+
+    titles = corpus_list.titles_for([idx for hits in ranked for idx, _ in hits])
+    for row, (key, hits) in enumerate(zip(keys, ranked)):
+        hits = [(titles[idx], dist) for idx, dist in hits]
+        if row not in fallback_rows:
+            # a raw-query fallback is only served until the LLM answers again
+            result_cache.put(key, hits)
+        for pos in pending[key]:
+            results[pos] = list(hits)
+    index_cache.record_query(search_seconds, time.perf_counter() - start)
     return results
 
+def recommend(query, top_n=2, filters=None, mode="vector"):
+    return recommend_many([query], top_n=top_n, filters=filters, mode=mode)[0]
+
 if __name__=='__main__':
-    query = "Batman"
-    print(recommend(query,top_n=15))
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-append":
+        for row in benchmark_append():
+            print(row)
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench-index":
+        # python similarity_search.py bench-index [n_vectors | catalogue]
+        if len(sys.argv) > 2 and sys.argv[2] == "catalogue":
+            _, catalogue_vectors = extract_vectors(read_index("movies.index"))
+            rows = benchmark_index_types(vectors=catalogue_vectors)
+        else:
+            rows = benchmark_index_types(n_vectors=int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+        for row in rows:
+            print(row)
+    elif len(sys.argv) > 1 and sys.argv[1] == "rebuild-index":
+        # python similarity_search.py rebuild-index [auto|flat|hnsw|ivf_flat|ivf_pq]
+        rebuild_index(sys.argv[2] if len(sys.argv) > 2 else "auto")
+    else:
+        query = "Batman"
+        print(recommend(query,top_n=15))
\ No newline at end of file
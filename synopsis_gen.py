@@ -3,12 +3,46 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 import pandas as pd
+import llm_cache
 # Load API Key from .env
 load_dotenv()
 API_KEY = os.environ.get("API_KEY")
 
+MODEL_NAME = "gemini-2.5-flash"
+
+
+class GeminiClient:
+    """Thin wrapper so ask_gemini can run against any client with generate(model, prompt)."""
+    name = "gemini"
+
+    def __init__(self, api_key):
+        self.client = genai.Client(api_key=api_key)
+
+    def generate(self, model, prompt):
+        response = self.client.models.generate_content(
+            model=model,
+            contents=[{"parts": [{"text": prompt}]}],
+            config=types.GenerateContentConfig(
+                thinking_config=types.ThinkingConfig(thinking_budget=0),
+                max_output_tokens=2000
+            )
+        )
+
+        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+            # print(f"Response: {response.candidates[0].content.parts[0].text}")
+            return "".join(part.text for part in response.candidates[0].content.parts if part.text)
+        else:
+            return "No response generated."
+
+
 # Initialize Gemini client
-client = genai.Client(api_key=API_KEY)
+client = GeminiClient(API_KEY)
+
+
+def set_client(new_client):
+    """Swap the backend (e.g. llm_cache.LocalStubClient for offline runs)."""
+    global client
+    client = new_client
 
 # System Prompt
 SYSTEM_PROMPT = """
@@ -26,20 +60,8 @@ def ask_gemini(user_message: str) -> str:
         
         full_prompt = SYSTEM_PROMPT.strip() + "\n\nUser query: " + user_message.strip()
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[{"parts": [{"text": full_prompt}]}],
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=0),
-                max_output_tokens=2000
-            )
-        )
-
-        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-            # print(f"Response: {response.candidates[0].content.parts[0].text}")
-            return "".join(part.text for part in response.candidates[0].content.parts if part.text)
-        else:
-            return "No response generated."
+        # identical prompts are answered from the response cache / shared in-flight call
+        return llm_cache.cached_generate(client, MODEL_NAME, full_prompt)
 
     except Exception as e:
         return f"An error occurred: {e}"
@@ -1,63 +1,106 @@
 import time
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from prophet import Prophet
+from datetime import datetime
+from forecast_cache import prophet_cache
+import fast_forecast
+
+BACKENDS = ("auto", "prophet") + fast_forecast.METHODS
+# "auto" forecasts daily series up to this many days past the series end with
+# Holt-Winters; longer horizons and weekly/monthly series go to Prophet
+FAST_HORIZON_DAYS = 28
 
 # -----------------------------
 # List of proxies (format: "ip:port" with authentication)
 # -----------------------------
 
 
+def forecast_series(data, until, backend="auto"):
+    """
+    Daily yhat Series from the day after data's last date to at least `until`,
+    from Prophet (cached fits) or one of the fast_forecast methods.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if backend == "auto":
+        horizon = (pd.to_datetime(until) - pd.to_datetime(data['ds'].max())).days
+        short = horizon <= FAST_HORIZON_DAYS and fast_forecast.is_daily(data)
+        backend = "holt_winters" if short else "prophet"
+    if backend == "prophet":
+        return prophet_cache.forecast(data, until)
+    return fast_forecast.forecast(data, until, method=backend)
+
+class TrendSeries:
+    """
+    A Google Trends CSV normalized once: ds as a sorted datetime64 array and y
+    aligned with it, so nearest-day lookups are a searchsorted instead of a sort.
+    """
+    def __init__(self, data_csv, title=None):
+        if data_csv.shape[0] == 0 or data_csv.shape[1] < 2:
+            raise ValueError(f"Google Trends data for {self._describe(data_csv, title)} is empty "
+                             "(expected a Day column and a value column)")
+        ds = pd.to_datetime(data_csv.iloc[:, 0], errors='coerce', format='%Y-%m-%d').to_numpy(dtype='datetime64[ns]')  # Day column
+        y = pd.to_numeric(data_csv.iloc[:, 1].replace('<1', 0), errors='coerce').to_numpy(dtype=np.float64)  # Dynamic trend column (e.g., 'Troy: (Worldwide)')
+        keep = ~np.isnat(ds)
+        if not keep.any():
+            raise ValueError(f"Google Trends data for {self._describe(data_csv, title)} has no parseable "
+                             "YYYY-MM-DD dates in its first column")
+        order = np.argsort(ds[keep], kind='stable')
+        self.ds = ds[keep][order]
+        self.y = y[keep][order]
+        self.last_date = pd.Timestamp(self.ds[-1])
+
+    @staticmethod
+    def _describe(data_csv, title):
+        # the uploaded file is named after its value column, e.g. 'Troy: (Worldwide)'
+        column = str(data_csv.columns[1]) if data_csv.shape[1] > 1 else None
+        if title and column:
+            return f"{title!r} ({column})"
+        return repr(title or column)
+
+    @property
+    def frame(self):
+        return pd.DataFrame({'ds': self.ds, 'y': self.y})
+
+    def nearest(self, dates):
+        """y of the closest day for each date (ties go to the earlier day)."""
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        right = np.clip(np.searchsorted(self.ds, dates), 0, len(self.ds) - 1)
+        left = np.clip(right - 1, 0, len(self.ds) - 1)
+        take_left = np.abs(dates - self.ds[left]) <= np.abs(self.ds[right] - dates)
+        return self.y[np.where(take_left, left, right)]
+
 # -----------------------------
 # Function to get Google Trends
 # -----------------------------
-def get_google_trend(title,target_date_str, data_csv):
-    target_date = pd.to_datetime(target_date_str)
-
+def get_google_trend(title, target_dates, data_csv, backend="auto"):
+    """
+    Trend score for one date ('YYYY-MM-DD' string or timestamp) or for a list
+    of dates. Dates up to the end of data_csv take the closest recorded day;
+    later dates share one forecast from the series end to the furthest of them
+    (backend "auto" picks by that horizon), clipped to 0-100.
 
-    data = pd.DataFrame()
-    data['ds'] = pd.to_datetime(data_csv.iloc[:, 0], errors='coerce', format='%Y-%m-%d')  # Day column
-    data['y']  = data_csv.iloc[:, 1]  # Dynamic trend column (e.g., 'Troy: (Worldwide)')
+    data_csv is the uploaded Google Trends DataFrame or a TrendSeries built from
+    it. Returns a float for a single date, a list of floats in input order
+    otherwise.
+    """
+    single = isinstance(target_dates, (str, datetime, pd.Timestamp))
+    dates = pd.to_datetime(pd.Series([target_dates] if single else list(target_dates))).to_numpy(dtype='datetime64[ns]')
+    series = data_csv if isinstance(data_csv, TrendSeries) else TrendSeries(data_csv, title)
 
-    print(data)
-    last_date = pd.to_datetime(data['ds'].max())
-    print(type(target_date),type(last_date))
+    scores = np.empty(len(dates), dtype=np.float64)
     # If target date is within historical data
-    if target_date <= last_date:
-        closest = data.iloc[(data['ds'] - target_date).abs().argsort()[:1]]
-        return float(closest['y'].values[0])
-    else:
-        # Otherwise forecast forward
-        m = Prophet(
-            growth="logistic",
-            yearly_seasonality=True,
-            weekly_seasonality=True,
-            daily_seasonality=False
-        )
-        print("is it working till  here 2")
-    
-        data['cap'] = 100
-        data['floor'] = 0
+    historical = dates <= series.last_date.to_datetime64()
+    scores[historical] = series.nearest(dates[historical])
+    # Otherwise forecast forward; Prophet fits are cached per series, later dates reuse them
+    if not historical.all():
+        future = dates[~historical]
+        forecast = forecast_series(series.frame, pd.Timestamp(future.max()), backend)
+        yhat = forecast.to_numpy()[forecast.index.get_indexer(future, method='nearest')]
+        scores[~historical] = np.clip(yhat, 0, 100)
 
-        m.fit(data)
-        print("is it working till  here 3")
-    
-        future = pd.DataFrame({
-            'ds': pd.date_range(start=last_date + timedelta(days=1),
-                                end=target_date,
-                                freq='D')
-        })
-        future['cap'] = 100
-        future['floor'] = 0
-        print("is it working till  here 4")
-    
-        forecast = m.predict(future)
-        closest_forecast = forecast.iloc[(forecast['ds'] - target_date).abs().argsort()[:1]]
-        yhat = float(closest_forecast['yhat'].values[0])
-    
-        print("is it working till  here 5")
-    
-        return max(0, min(100, yhat))
+    scores = [float(score) for score in scores]
+    return scores[0] if single else scores
 
 # -----------------------------
 # Example usage
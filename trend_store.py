@@ -0,0 +1,123 @@
+import os
+import time
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+TREND_DB = "trends.db"
+
+
+def title_key(title):
+    return " ".join(str(title).split()).lower()
+
+
+def parse_trend_frame(data_csv):
+    """
+    Uploaded Google Trends DataFrame (Day column, then the title's value column)
+    -> ('YYYY-MM-DD', value) rows, unparseable days dropped and '<1' read as 0.
+    """
+    days = pd.to_datetime(data_csv.iloc[:, 0], errors='coerce', format='%Y-%m-%d')
+    values = pd.to_numeric(data_csv.iloc[:, 1].replace('<1', 0), errors='coerce')
+    keep = days.notna() & values.notna()
+    return list(zip(days[keep].dt.strftime('%Y-%m-%d'), values[keep].astype(float)))
+
+
+class TrendStore:
+    """
+    Per-user Google Trends series, one row per (title, day) in
+    User/<name>/trends.db. Uploads are merged into what is already stored:
+    new days are added and days present in both keep the newest upload's value,
+    so overlapping or extending date ranges can be uploaded incrementally.
+    Titles match case- and whitespace-insensitively.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS titles ("
+                "key TEXT PRIMARY KEY, title TEXT NOT NULL, column_name TEXT, updated REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS trends ("
+                "key TEXT NOT NULL, day TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (key, day)) WITHOUT ROWID"
+            )
+
+    def upsert(self, title, data_csv):
+        """Merge an uploaded series for title; returns the number of days written."""
+        rows = parse_trend_frame(data_csv)
+        if not rows:
+            return 0
+        key = title_key(title)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO titles (key, title, column_name, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET title=excluded.title, column_name=excluded.column_name, updated=excluded.updated",
+                (key, str(title).strip(), str(data_csv.columns[1]), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO trends (key, day, value) VALUES (?, ?, ?)",
+                [(key, day, value) for day, value in rows],
+            )
+        return len(rows)
+
+    def get(self, title):
+        """
+        The stored series in the uploaded format (Day column, value column), or
+        None when nothing is stored for title.
+        """
+        key = title_key(title)
+        with self._lock:
+            meta = self._conn.execute("SELECT title, column_name FROM titles WHERE key=?", (key,)).fetchone()
+            rows = self._conn.execute("SELECT day, value FROM trends WHERE key=? ORDER BY day", (key,)).fetchall()
+        if meta is None or not rows:
+            return None
+        column = meta[1] or f"{meta[0]}: (Worldwide)"
+        days, values = zip(*rows)
+        return pd.DataFrame({'Day': list(days), column: np.asarray(values, dtype=np.float64)})
+
+    def get_many(self, titles):
+        """{title: series} for the titles that have stored data."""
+        found = {}
+        for title in titles:
+            series = self.get(title)
+            if series is not None:
+                found[title] = series
+        return found
+
+    def date_range(self, title):
+        """(first_day, last_day, n_days) stored for title, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(day), MAX(day), COUNT(*) FROM trends WHERE key=?", (title_key(title),)
+            ).fetchone()
+        return row if row[2] else None
+
+    def titles(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT title FROM titles ORDER BY title")]
+
+    def delete(self, title):
+        key = title_key(title)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM trends WHERE key=?", (key,))
+            self._conn.execute("DELETE FROM titles WHERE key=?", (key,))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_trend_store(parent_directory):
+    """The TrendStore of a user folder (e.g. 'User/alice'), one instance per process."""
+    path = os.path.abspath(os.path.join(parent_directory, TREND_DB))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            os.makedirs(parent_directory, exist_ok=True)
+            store = _stores[path] = TrendStore(path)
+        return store
@@ -1,5 +1,6 @@
 import os
-import pandas as pd
+import hashlib
+from prediction_store import open_prediction_store
 
 class Create_User:
     def __init__(self,username,dataframe):
@@ -12,6 +13,14 @@ class Create_User:
         os.makedirs(f'User/{self.user_name}')
         self.dataframe.to_csv(f'User/{self.user_name}/{self.user_name}.csv')
 
+def file_sha256(path,chunk_size=1<<20):
+    """Stream a file through sha256 and return the hex digest."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 def check_model_training_status(user_name):
     if 'model.pth' not in os.listdir(f'User/{user_name}'):
         return False
@@ -20,38 +29,41 @@ def check_model_training_status(user_name):
     
 
 class cache_memory:
+    """
+    Prediction cache of a user, stored in User/<name>/predictions.db (see
+    prediction_store). <name>_cache.csv is only written on export_csv.
+    """
     def __init__(self,user_name):
         self.user_name=user_name
-    
-    def create_cache(self):
-        df=pd.DataFrame(columns=['Title','Upload_Date','Hype_Score','Min','Avg','Max'])
-        df.to_csv(f'User/{self.user_name}/{self.user_name}_cache.csv',index=False)
+        self.csv_path=f'User/{self.user_name}/{self.user_name}_cache.csv'
+        self.store=open_prediction_store(f'User/{self.user_name}',legacy_csv=self.csv_path)
 
     def load_cache(self):
-        df=pd.read_csv(f'User/{self.user_name}/{self.user_name}_cache.csv')
-        self.loaded_dataframe=df
-    
-    def dump_data(self,movie_name,date,trend_score,min_view,avg_view,max_view):
-        df = pd.DataFrame({
-            'Title': [movie_name],
-            'Upload_Date': [date],
-            'Hype_Score': [trend_score],
-            'Min': [min_view],
-            'Avg':[avg_view],
-            'Max': [max_view]
-        })
-
-        print(df)
-        df.to_csv(f'User/{self.user_name}/{self.user_name}_cache.csv',mode='a',header=False,index=False)
-        print('Saving Successful')
-        print('#'*30)
+        self.loaded_dataframe=self.store.history()
+
+    def lookup(self,movie_name,date,model_version=''):
+        """
+        Cached prediction dict for (title, date) made by model_version, matched
+        case-insensitively, or None. Predictions of other model versions never match.
+        """
+        return self.store.lookup(movie_name,date,model_version)
+
+    def dump_data(self,movie_name,date,trend_score,min_view,avg_view,max_view,model_version=''):
+        # the request that produced the prediction counts as its first hit
+        self.store.put({'title':movie_name,'release date':date,'hype score':trend_score,
+                        'minimum_view':min_view,'avg_view':avg_view,'max':max_view,
+                        'model_version':model_version,'hit_count':1})
+
+    def dump_many(self,results):
+        """Store many model_inference result dicts in one write."""
+        return self.store.put_many(results)
+
+    def export_csv(self):
+        """Write the history to <name>_cache.csv and return its path."""
+        return self.store.export_csv(self.csv_path)
 
     def check_for_cache(self):
-        
-        if os.path.exists(f'User/{self.user_name}/{self.user_name}_cache.csv'):
-            self.load_cache()
-        else: 
-            self.create_cache()
+        self.load_cache()
     
 
 
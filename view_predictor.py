@@ -0,0 +1,24 @@
+import torch.nn as nn
+
+
+# Shared by training (model_work.model_train) and every inference path so the
+# saved state_dict always matches the architecture it is loaded into.
+class ViewPredictor(nn.Module):
+    def __init__(self, input_dim):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.Dropout(0.1),
+            nn.Linear(input_dim, 64),
+            nn.BatchNorm1d(64),
+            nn.ReLU(),
+            nn.Dropout(0.4),
+            nn.Linear(64, 32),
+            nn.BatchNorm1d(32),
+            nn.ReLU(),
+            nn.Dropout(0.4),
+
+            nn.Linear(32, 1)
+        )
+
+    def forward(self, x):
+        return self.net(x)